@@ -4,10 +4,112 @@ takes the queries as input until none is given and stops.
 
 Author: Luke Chelius
 """
+from movie_store import movies_of_type
+import instrument  # span, count, counted, profiled
 import operator
+import output  # TextSink
+import query_cache  # MISSING
+from rollups import FIELDS, Rollups
 import sys
 from timeit import default_timer as timer
 
+sink = output.TextSink()  # Where the results of the queries are written, see set_output
+cache = None  # The query_cache.ResultCache the results are kept in, or None to always find them, see set_cache
+engine = None  # The vectorized.VectorEngine that answers the queries it can with NumPy, or None, see set_engine
+rollups = None  # The rollups.Rollups STATS and HISTOGRAM are answered from, see set_rollups
+
+
+def set_output(new_sink) -> None:
+    """
+    Changes where and in which format the results of the queries are written.
+    :param new_sink: The output.Sink to use from now on
+    :return: None
+    """
+    global sink
+    sink = new_sink
+
+
+def set_cache(new_cache) -> None:
+    """
+    Starts keeping the results of the queries in a cache, or stops if None is given.
+    :param new_cache: The query_cache.ResultCache to use, or None
+    :return: None
+    """
+    global cache
+    cache = new_cache
+
+
+def set_engine(new_engine) -> None:
+    """
+    Starts answering YEAR_AND_GENRE, RUNTIME, MOST_VOTES and TOP with NumPy, or stops if None is given.
+    :param new_engine: The vectorized.VectorEngine for the movies and ratings being queried, or None
+    :return: None
+    """
+    global engine
+    engine = new_engine
+
+
+def set_rollups(new_rollups) -> None:
+    """
+    Changes the rollups STATS and HISTOGRAM are answered from. movies_main makes them once the dataset is loaded if
+    they have to exist before the queries are split between workers or clients, or the queries ask for them;
+    otherwise the first of those queries makes them from the whole dataset. Set them to None to throw them out when
+    other movies are going to be queried.
+    :param new_rollups: The rollups.Rollups of the movies and ratings being queried, or None
+    :return: None
+    """
+    global rollups
+    rollups = new_rollups
+
+
+def cached(query: tuple, find):
+    """
+    Gets the results of a query from the cache, or finds them and adds them to it.
+    :param query: The tuple given by parse_query
+    :param find: Function that finds the results when they aren't cached
+    :return: The results
+    """
+    if cache is None:
+        return find()
+    results = cache.get(query)
+    if results is query_cache.MISSING:
+        results = find()
+        cache.put(query, results)
+    return results
+
+
+def find_lookup(tconst: str, movies: dict, ratings: dict):
+    """
+    Searches the movies and ratings dictionaries for a specific tconst.
+    :param tconst: The 'serial number' of a certain movie/show on IMDB
+    :param movies: The dictionary with the tconst values as the key for each Movie object
+    :param ratings: A dictionary with the tconst values as the key for each Rating object
+    :return: A tuple of the Movie and Rating objects, or None if either isn't found
+    """
+    if tconst in movies and tconst in ratings:
+        return movies[tconst], ratings[tconst]
+    return None
+
+
+def print_lookup(tconst: str, found) -> None:
+    """
+    Writes the movie and rating found for a tconst, or that they weren't found, to the output.
+    :param tconst: The 'serial number' of a certain movie/show on IMDB
+    :param found: The tuple of the Movie and Rating objects given by find_lookup, or None
+    :return: None
+    """
+    sink.lookup(tconst, found)
+
+
+def print_movies(results: list) -> None:
+    """
+    Writes info on each movie in a list of Movie objects to the output, or that there was no match if it's empty. Used
+    by CONTAINS, YEAR_AND_GENRE and RUNTIME.
+    :param results: The list of Movie objects
+    :return: None
+    """
+    sink.movies(results)
+
 
 def lookup(tconst: str, movies: dict, ratings: dict) -> None:
     """
@@ -18,27 +120,18 @@ def lookup(tconst: str, movies: dict, ratings: dict) -> None:
     :param ratings: A dictionary with the tconst values as the key for each Rating object
     :return: None
     """
-    print("\nprocessing: LOOKUP", tconst)
+    sink.begin("LOOKUP", tconst)
     start = timer()  # Starts timing
-
-    # If both the movie and rating are found prints the info
-    if tconst in movies and tconst in ratings:
-        print("\tMOVIE: Identifier:", tconst + ", Title:", movies[tconst].primary_title + ", Type:",
-              movies[tconst].title_type + ", Year:", str(movies[tconst].start_year) + ", Runtime:",
-              str(movies[tconst].run_time_mins) + ", Genres:", ", ".join(movies[tconst].genres.split(",")))
-        print("\tRATING: Identifier:", tconst + ", Rating:", str(ratings[tconst].average_rating) + ", Votes:",
-              str(ratings[tconst].num_votes))
-
-    # Prints if the movie or rating isn't found
-    else:
-        print("\tMovie not found!")
-        print("\tRating not found!")
-
+    with instrument.span("LOOKUP.find"):
+        found = cached(("LOOKUP", tconst), lambda: find_lookup(tconst, movies, ratings))
+    with instrument.span("LOOKUP.format"):
+        print_lookup(tconst, found)
     elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
-    print("elapsed time (s):", elapsed)
+    with instrument.span("LOOKUP.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
 
 
-def contains(movie_type: str, words: str, movies: dict) -> None:
+def find_contains(movie_type: str, words: str, movies: dict, index=None, candidates=None) -> list:
     """
     Takes a type of movie and a series of words or characters and finds any titles in the dataset of movies that
     are of that type and contain those words or series of characters in the primary title.
@@ -46,34 +139,49 @@ def contains(movie_type: str, words: str, movies: dict) -> None:
     :param words: The series of words or characters that is to be looked for in the primary title of movies of the
                     specified type
     :param movies: The dictionary containing all the titles from the movie dataset
-    :return: None
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param candidates: The Movie objects of the specified type in dictionary order, if they were already found
+    :return: A list of the Movie objects found, in dictionary order
     """
-    print("\nprocessing: CONTAINS", movie_type, words)
-    start = timer()  # Starts timing
     results = []  # Empty list to store Movie objects (could be multiple found)
 
-    # Iterates through all keys in the dictionary
-    for movie in movies:
-        # If the title_type equals the specified one and the sequence of words appears in the title it appends it
-        if movies[movie].title_type == movie_type and words in movies[movie].primary_title:
-            results.append(movies[movie])
-
-    # Prints info on each movie by iterating through the list of Movie objects
-    if len(results) > 0:
-        for item in results:
-            print("\tIdentifier:", item.movie_id + ", Title:", item.primary_title + ", Type:", item.title_type +
-                  ", Year:", str(item.start_year) + ", Runtime:", str(item.run_time_mins) + ", Genres:",
-                  ", ".join(item.genres.split(",")))
-
-    # Prints if there were no Movie objects found
-    else:
-        print("\tNo match found!")
-
+    # Iterates through all Movie objects of the specified type in the dictionary, or the ones the index finds
+    if candidates is None and index is None:
+        candidates = movies_of_type(movies, movie_type)
+    elif candidates is None:
+        candidates = index.of_type_containing(movie_type, words)
+    with instrument.span("CONTAINS.filter"):
+        for movie in instrument.counted(candidates, "CONTAINS.rows_scanned"):
+            # If the sequence of words appears in the title it appends it
+            if words in movie.primary_title:
+                results.append(movie)
+    instrument.count("CONTAINS.rows_matched", len(results))
+    return results
+
+
+def contains(movie_type: str, words: str, movies: dict, index=None) -> None:
+    """
+    Prints the titles of a type that contain a series of words or characters in the primary title (see
+    find_contains).
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param words: The series of words or characters that is to be looked for in the primary title of movies of the
+                    specified type
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    sink.begin("CONTAINS", movie_type, words)
+    start = timer()  # Starts timing
+    with instrument.span("CONTAINS.find"):
+        results = cached(("CONTAINS", movie_type, words), lambda: find_contains(movie_type, words, movies, index))
+    with instrument.span("CONTAINS.format"):
+        print_movies(results)
     elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
-    print("elapsed time (s):", elapsed)
+    with instrument.span("CONTAINS.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
 
 
-def year_and_genre(movie_type: str, year: int, genre: str, movies: dict) -> None:
+def find_year_and_genre(movie_type: str, year: int, genre: str, movies: dict, index=None, candidates=None) -> list:
     """
     Takes a type of movie, the release year, and a genre and searches through the dictionary of Movie objects to
     find every movie in it that has the same type, release year, and genre.
@@ -81,123 +189,208 @@ def year_and_genre(movie_type: str, year: int, genre: str, movies: dict) -> None
     :param year: The start year of the movies being searched for
     :param genre: The genre of the movies being searched for
     :param movies: The dictionary containing all the titles from the movie dataset
-    :return: None
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param candidates: The Movie objects of the specified type in dictionary order, if they were already found
+    :return: A list of the Movie objects found, sorted alphabetically by title
     """
-    print("\nprocessing: YEAR_AND_GENRE", movie_type, year, genre)
-    start = timer()  # Starts timing
+    # Answers with the arrays of the vectorized engine if there is one
+    if engine is not None:
+        with instrument.span("YEAR_AND_GENRE.vectorized"):
+            results = engine.year_and_genre(movie_type, year, genre)
+        if results is not None:
+            instrument.count("YEAR_AND_GENRE.rows_matched", len(results))
+            return results
     results = []  # Empty list to store Movie objects (could be multiple found)
 
-    # Iterates through all keys in the dictionary
-    for movie in movies:
-        # If the movie's type, release year, and genre match it adds the Movie to results
-        if movies[movie].title_type == movie_type and movies[movie].start_year == year and \
-                genre in movies[movie].genres:
-            results.append(movies[movie])
-
-    # Prints the info for each Movie in results
-    if len(results) > 0:
+    # Iterates through all Movie objects of the specified type in the dictionary, or the ones the index finds
+    if candidates is None and index is None:
+        candidates = movies_of_type(movies, movie_type)
+    elif candidates is None:
+        candidates = index.of_type_year_genre(movie_type, year, genre)
+    with instrument.span("YEAR_AND_GENRE.filter"):
+        for movie in instrument.counted(candidates, "YEAR_AND_GENRE.rows_scanned"):
+            # If the movie's release year and genre match it adds the Movie to results
+            if movie.start_year == year and genre in movie.genres:
+                results.append(movie)
+    instrument.count("YEAR_AND_GENRE.rows_matched", len(results))
+
+    with instrument.span("YEAR_AND_GENRE.sort"):
         results.sort(key=operator.attrgetter("primary_title"))  # Sorts the Movies alphabetically by title
-        for item in results:
-            print("\tIdentifier:", item.movie_id + ", Title:", item.primary_title + ", Type:", item.title_type +
-                  ", Year:", str(item.start_year) + ", Runtime:", str(item.run_time_mins) +
-                  ", Genres:", ", ".join(item.genres.split(",")))
+        instrument.count("YEAR_AND_GENRE.sort_calls", 1)
+    return results
 
-    # Prints if no movies were found
-    else:
-        print("\tNo match found!")
 
+def year_and_genre(movie_type: str, year: int, genre: str, movies: dict, index=None) -> None:
+    """
+    Prints every movie that has the same type, release year, and genre (see find_year_and_genre).
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param year: The start year of the movies being searched for
+    :param genre: The genre of the movies being searched for
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    sink.begin("YEAR_AND_GENRE", movie_type, year, genre)
+    start = timer()  # Starts timing
+    with instrument.span("YEAR_AND_GENRE.find"):
+        results = cached(("YEAR_AND_GENRE", movie_type, year, genre),
+                         lambda: find_year_and_genre(movie_type, year, genre, movies, index))
+    with instrument.span("YEAR_AND_GENRE.format"):
+        print_movies(results)
     elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
-    print("elapsed time (s):", elapsed)
+    with instrument.span("YEAR_AND_GENRE.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
 
 
-def runtime(movie_type: str, min_mins: int, max_mins: int, movies: dict) -> None:
+def find_runtime(movie_type: str, min_mins: int, max_mins: int, movies: dict, index=None, candidates=None) -> list:
     """
-    Finds all movies of a certain type between a minimum and maximum runtime (inclusive), and prints info on the
-    found movies.
+    Finds all movies of a certain type between a minimum and maximum runtime (inclusive).
     :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
     :param min_mins: The minimum runtime for the movie
     :param max_mins: The maximum runtime for the movie
     :param movies: The dictionary containing all the titles from the movie dataset
-    :return: None
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param candidates: The Movie objects of the specified type in dictionary order, if they were already found
+    :return: A list of the Movie objects found, longest first and alphabetically by title for the same runtime
     """
-    print("\nprocessing: RUNTIME", movie_type, min_mins, max_mins)
-    start = timer()  # Starts timing
+    # Answers with the arrays of the vectorized engine if there is one
+    if engine is not None:
+        with instrument.span("RUNTIME.vectorized"):
+            results = engine.runtime(movie_type, min_mins, max_mins)
+        if results is not None:
+            instrument.count("RUNTIME.rows_matched", len(results))
+            return results
     results = []  # Blank list to store results
 
-    # Iterates through each key in the dictionary
-    for movie in movies:
-        # If the movie is the right type and within the min and max runtimes (inclusive) it's appended to results
-        if movies[movie].title_type == movie_type and min_mins <= movies[movie].run_time_mins <= max_mins:
-            results.append(movies[movie])
-
-    # Prints info on the movies in the results list
-    if len(results) > 0:
+    # Iterates through each Movie object of the specified type in the dictionary, or the ones the index finds
+    if candidates is None and index is None:
+        candidates = movies_of_type(movies, movie_type)
+    elif candidates is None:
+        candidates = index.of_type_runtime(movie_type, min_mins, max_mins)
+    with instrument.span("RUNTIME.filter"):
+        for movie in instrument.counted(candidates, "RUNTIME.rows_scanned"):
+            # If the movie is within the min and max runtimes (inclusive) it's appended to results
+            if min_mins <= movie.run_time_mins <= max_mins:
+                results.append(movie)
+    instrument.count("RUNTIME.rows_matched", len(results))
+
+    with instrument.span("RUNTIME.sort"):
         results.sort(key=operator.attrgetter("primary_title"))  # Sorts movies alphabetically by title
         results.sort(key=operator.attrgetter("run_time_mins"), reverse=True)  # Sorts movies short to long by runtime
-        for item in results:
-            print("\tIdentifier:", item.movie_id + ", Title:", item.primary_title + ", Type:", item.title_type +
-                  ", Year:", str(item.start_year) + ", Runtime:", str(item.run_time_mins) +
-                  ", Genres:", ", ".join(item.genres.split(",")))
+        instrument.count("RUNTIME.sort_calls", 2)
+    return results
 
-    # Prints if no movies were found with the given parameters
-    else:
-        print("\tNo match found!")
 
+def runtime(movie_type: str, min_mins: int, max_mins: int, movies: dict, index=None) -> None:
+    """
+    Prints all movies of a certain type between a minimum and maximum runtime (inclusive) (see find_runtime).
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param min_mins: The minimum runtime for the movie
+    :param max_mins: The maximum runtime for the movie
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    sink.begin("RUNTIME", movie_type, min_mins, max_mins)
+    start = timer()  # Starts timing
+    with instrument.span("RUNTIME.find"):
+        results = cached(("RUNTIME", movie_type, min_mins, max_mins),
+                         lambda: find_runtime(movie_type, min_mins, max_mins, movies, index))
+    with instrument.span("RUNTIME.format"):
+        print_movies(results)
     elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
-    print("elapsed time (s):", elapsed)
+    with instrument.span("RUNTIME.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
 
 
-def most_votes(movie_type: str, num: int, movies: dict, ratings: dict) -> None:
+def find_most_votes(movie_type: str, num: int, movies: dict, ratings: dict, index=None, candidates=None) -> list:
     """
     Finds a certain number of movies of a certain type with the most votes out of all the movies of that type.
     :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
     :param num: The number of movies with the most votes to find
     :param movies: The dictionary containing all the titles from the movie dataset
     :param ratings: The dictionary containing all the ratings from the rating dataset
-    :return: None
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param candidates: The Movie objects of the specified type in dictionary order, if they were already found
+    :return: A list of the Rating objects of the movies found, by most votes then title
     """
-    print("\nprocessing: MOST_VOTES", movie_type, num)
-    start = timer()  # Starts timing
+    # Answers with the arrays of the vectorized engine if there is one
+    if engine is not None:
+        with instrument.span("MOST_VOTES.vectorized"):
+            results = engine.most_votes(movie_type, num)
+        if results is not None:
+            instrument.count("MOST_VOTES.rows_matched", len(results))
+            return results
     results = []  # A blank list to store the results
 
-    # Iterates through each key in the dictionary
-    for movie in movies:
-        # If the movie is the correct type and has a rating, it will compare its votes
-        if movies[movie].title_type == movie_type and movie in ratings:
-            # If there are less that the specified number of movies in the list it automatically is added
-            if len(results) < num:
-                results.append(ratings[movie])
-                results.sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
-                results.sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts the list by most votes
-            # If the movie has more votes than the movie with the least number of votes in the list it replaces it
-            elif ratings[movie].num_votes > results[-1].num_votes:
-                results[-1] = ratings[movie]
-                results.sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
-                results.sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts the list by most votes
-
-    # If movies were found it prints info on each one
-    if len(results) > 0:
-        # Prints the movies in order of most votes to least votes in the results
-        for i, item in enumerate(results):
-            print("\t" + str(i + 1) + ". VOTES:", str(item.num_votes) + ", MOVIE: Identifier:",
-                  item.movie_id + ", Title:", movies[item.movie_id].primary_title + ", Type:",
-                  movies[item.movie_id].title_type + ", Year:", str(movies[item.movie_id].start_year) + ", Runtime:",
-                  str(movies[item.movie_id].run_time_mins) + ", Genres:",
-                  ", ".join(movies[item.movie_id].genres.split(",")))
-
-    # Prints if no movies were found with the given parameters
-    else:
-        print("\tNo match found!")
+    # Takes the movies off the ranking by votes if the index has one, so there's nothing left to search
+    if candidates is None and index is not None and index.rankings is not None and num > 0:
+        results = index.rankings.most_votes(movie_type, num)
+        candidates = ()
+    # Otherwise iterates through each Movie object of the specified type in the dictionary
+    elif candidates is None:
+        candidates = movies_of_type(movies, movie_type) if index is None else index.of_type(movie_type)
+    with instrument.span("MOST_VOTES.filter"):
+        for info in instrument.counted(candidates, "MOST_VOTES.rows_scanned"):
+            movie = info.movie_id
+            # If the movie has a rating, it will compare its votes
+            if movie in ratings:
+                # If there are less that the specified number of movies in the list it automatically is added
+                if len(results) < num:
+                    results.append(ratings[movie])
+                    results.sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
+                    results.sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts the list by most votes
+                    instrument.count("MOST_VOTES.sort_calls", 2)
+                # If the movie has more votes than the movie with the least number of votes in the list it replaces it
+                elif ratings[movie].num_votes > results[-1].num_votes:
+                    results[-1] = ratings[movie]
+                    results.sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
+                    results.sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts the list by most votes
+                    instrument.count("MOST_VOTES.sort_calls", 2)
+    instrument.count("MOST_VOTES.rows_matched", len(results))
+
+    return results
+
+
+def print_most_votes(results: list, movies: dict) -> None:
+    """
+    Writes the movies found by find_most_votes with their number of votes to the output.
+    :param results: The list of Rating objects given by find_most_votes
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :return: None
+    """
+    sink.most_votes(results, movies)
 
+
+def most_votes(movie_type: str, num: int, movies: dict, ratings: dict, index=None) -> None:
+    """
+    Prints a certain number of movies of a certain type with the most votes out of all the movies of that type (see
+    find_most_votes).
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param num: The number of movies with the most votes to find
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    sink.begin("MOST_VOTES", movie_type, num)
+    start = timer()  # Starts timing
+    with instrument.span("MOST_VOTES.find"):
+        results = cached(("MOST_VOTES", movie_type, num),
+                         lambda: find_most_votes(movie_type, num, movies, ratings, index))
+    with instrument.span("MOST_VOTES.format"):
+        print_most_votes(results, movies)
     elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
-    print("elapsed time (s):", elapsed)
+    with instrument.span("MOST_VOTES.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
 
 
-def top(movie_type: str, num: int, begin_year: int, stop_year: int, movies: dict, ratings: dict) -> None:
+def find_top(movie_type: str, num: int, begin_year: int, stop_year: int, movies: dict, ratings: dict, index=None,
+             candidates=None) -> list:
     """
     Searches movies of a type that fall between a start and end year (inclusive) and finds the a certain number of
-    the top rated movies from every year between the start and end years (inclusive). It prints them out in order
-    of decreasing rating, if the same then decreasing number of votes, and if that is tied then alphabetically
+    the top rated movies from every year between the start and end years (inclusive). They are ordered by
+    decreasing rating, if the same then decreasing number of votes, and if that is tied then alphabetically
     by title.
     :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
     :param num: The number of movies with the most votes to find
@@ -205,74 +398,281 @@ def top(movie_type: str, num: int, begin_year: int, stop_year: int, movies: dict
     :param stop_year: The year to stop finding movies at (inclusive)
     :param movies:The dictionary containing all the titles from the movie dataset
     :param ratings: The dictionary containing all the ratings from the rating dataset
-    :return: None
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param candidates: The Movie objects of the specified type in dictionary order, if they were already found
+    :return: A list with a list of Rating objects for each year, from begin_year to stop_year
     """
-    print("\nprocessing: TOP", movie_type, num, begin_year, stop_year)
-    start = timer()  # Starts timing
+    # Answers with the arrays of the vectorized engine if there is one
+    if engine is not None:
+        with instrument.span("TOP.vectorized"):
+            results = engine.top(movie_type, num, begin_year, stop_year)
+        if results is not None:
+            instrument.count("TOP.rows_matched", sum(map(len, results)))
+            return results
     results = []  # A blank list to store the results
     # Makes results into a 2D list with one list inside results for each year movies are being searched for
     for k in range(stop_year - begin_year + 1):
         results.append([])
 
-    # Iterates through each key in the dictionary
-    for movie in movies:
-        # If the type matches, the movie has a rating, its votes are >= 1000 and it falls between the years (inclusive)
-        # then it will compare its rating
-        if movies[movie].title_type == movie_type and movie in ratings and ratings[movie].num_votes >= 1000 and \
-                begin_year <= movies[movie].start_year <= stop_year:
-            year = stop_year - movies[movie].start_year  # Finds the index in result for the correct list for the year
-            # If there are less than the specified number of movies needed its automatically appended
-            if len(results[year]) < num:
-                results[year].append(ratings[movie])
-                results[year].sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
-                results[year].sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts the list by most votes
-                results[year].sort(key=operator.attrgetter("average_rating"), reverse=True)  # Sorts the list by rating
-            # If the movie has a higher rating than the lowest in the list it replaces the lowest
-            # if they are tied for rating, if it has more votes it replaces the lowest
-            elif ratings[movie].average_rating > results[year][-1].average_rating or (ratings[movie].average_rating ==
-                                                                                      results[year][-1].average_rating
-                                                                                      and ratings[movie].num_votes >
-                                                                                      results[year][-1].num_votes):
-                results[year][-1] = ratings[movie]
-                results[year].sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
-                results[year].sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts the list by most votes
-                results[year].sort(key=operator.attrgetter("average_rating"), reverse=True)  # Sorts the list by rating
+    # Takes each year's movies off the rankings by rating if the index has them, so there's nothing left to search
+    if candidates is None and index is not None and index.rankings is not None and num > 0:
+        for year in range(begin_year, stop_year + 1):
+            results[stop_year - year] = index.rankings.top(movie_type, num, year)
+        candidates = ()
+    # Otherwise iterates through each Movie object of the specified type in the dictionary, or the ones the index finds
+    elif candidates is None and index is None:
+        candidates = movies_of_type(movies, movie_type)
+    elif candidates is None:
+        candidates = index.of_type_years(movie_type, begin_year, stop_year)
+    with instrument.span("TOP.filter"):
+        for info in instrument.counted(candidates, "TOP.rows_scanned"):
+            movie = info.movie_id
+            # If the movie has a rating, its votes are >= 1000 and it falls between the years (inclusive) then it will
+            # compare its rating
+            if movie in ratings and ratings[movie].num_votes >= 1000 and begin_year <= info.start_year <= stop_year:
+                year = stop_year - info.start_year  # Finds the index in result for the correct list for the year
+                # If there are less than the specified number of movies needed its automatically appended
+                if len(results[year]) < num:
+                    results[year].append(ratings[movie])
+                    results[year].sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
+                    results[year].sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts by most votes
+                    results[year].sort(key=operator.attrgetter("average_rating"), reverse=True)  # Sorts by rating
+                    instrument.count("TOP.sort_calls", 3)
+                # If the movie has a higher rating than the lowest in the list it replaces the lowest
+                # if they are tied for rating, if it has more votes it replaces the lowest
+                elif ratings[movie].average_rating > results[year][-1].average_rating or (
+                        ratings[movie].average_rating == results[year][-1].average_rating
+                        and ratings[movie].num_votes > results[year][-1].num_votes):
+                    results[year][-1] = ratings[movie]
+                    results[year].sort(key=lambda rating: movies[rating.movie_id].primary_title)  # Sorts by title
+                    results[year].sort(key=operator.attrgetter("num_votes"), reverse=True)  # Sorts by most votes
+                    results[year].sort(key=operator.attrgetter("average_rating"), reverse=True)  # Sorts by rating
+                    instrument.count("TOP.sort_calls", 3)
+    instrument.count("TOP.rows_matched", sum(map(len, results)))
 
     results.reverse()  # Reverses results because they are in descending year order to begin
-    # Iterates through the lists for each year
-    for i, result in enumerate(results):
-        # If the list has movies in it it prints them
-        if len(result) > 0:
-            print("\tYEAR:", begin_year + i)  # Prints the year the movies are from
-            # Prints each movie in the list ranked in the specified order
-            for j, item in enumerate(result):
-                print("\t\t" + str(j + 1) + ". RATING:", str(item.average_rating) + ", VOTES:", str(item.num_votes) +
-                      ", MOVIE: Identifier:", item.movie_id + ", Title:", movies[item.movie_id].primary_title +
-                      ", Type:", movies[item.movie_id].title_type + ", Year:", str(movies[item.movie_id].start_year) +
-                      ", Runtime:", str(movies[item.movie_id].run_time_mins) + ", Genres:",
-                      ", ".join(movies[item.movie_id].genres.split(",")))
-
-        # Prints if no movies from the given year were found
-        else:
-            print("\tYEAR:", begin_year + i)
-            print("\t\tNo match found!")
+    return results
+
+
+def print_top(results: list, begin_year: int, movies: dict) -> None:
+    """
+    Writes the movies found by find_top for each year with their rating and number of votes to the output.
+    :param results: The list of lists of Rating objects given by find_top
+    :param begin_year: The first year the movies were found for
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :return: None
+    """
+    sink.top(results, begin_year, movies)
+
+
+def top(movie_type: str, num: int, begin_year: int, stop_year: int, movies: dict, ratings: dict, index=None) -> None:
+    """
+    Prints a certain number of the top rated movies of a type from every year between the start and end years
+    (inclusive) (see find_top).
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param num: The number of movies with the most votes to find
+    :param begin_year: The year to begin finding movies at (inclusive)
+    :param stop_year: The year to stop finding movies at (inclusive)
+    :param movies:The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    sink.begin("TOP", movie_type, num, begin_year, stop_year)
+    start = timer()  # Starts timing
+    with instrument.span("TOP.find"):
+        results = cached(("TOP", movie_type, num, begin_year, stop_year),
+                         lambda: find_top(movie_type, num, begin_year, stop_year, movies, ratings, index))
+    with instrument.span("TOP.format"):
+        print_top(results, begin_year, movies)
+    elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
+    with instrument.span("TOP.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
+
+
+def find_stats(movie_type: str, genre: str, begin_year: int, stop_year: int, movies: dict, ratings: dict) -> list:
+    """
+    Finds the number of titles of a type and genre that started in each year between the start and end years
+    (inclusive), how many are rated, their average rating, their total votes and their average runtime, and the same
+    for all the years together.
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param genre: One of the genres of the movies, or ALL for every movie
+    :param begin_year: The year to begin at (inclusive)
+    :param stop_year: The year to stop at (inclusive)
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :return: A list of (year, titles, rated, average rating, votes, average runtime) tuples for each year, then one
+                with None for the year for all of them
+    """
+    totals = _rollups(movies, ratings, "STATS")
+    with instrument.span("STATS.cells"):
+        return totals.stats(movie_type, genre, begin_year, stop_year)
+
+
+def find_histogram(movie_type: str, field: str, buckets: int, movies: dict, ratings: dict) -> list:
+    """
+    Counts the titles of a type in equal ranges of their rating, votes, runtime or start year.
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param field: rating, votes, runtime or year
+    :param buckets: The number of ranges to count the titles in
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :return: A list of (lowest, highest, titles) tuples for each range, empty if no title has the field
+    """
+    totals = _rollups(movies, ratings, "HISTOGRAM")
+    with instrument.span("HISTOGRAM.cells"):
+        return totals.histogram(movie_type, field, buckets)
+
+
+def _rollups(movies: dict, ratings: dict, name: str) -> Rollups:
+    """
+    Gets the rollups an aggregate query is answered from, adding them up from every movie the first time if they
+    weren't made when the dataset was loaded.
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param name: The name of the query, for its span and counter
+    :return: The Rollups
+    """
+    if rollups is None:
+        with instrument.span(name + ".build"):
+            set_rollups(Rollups(instrument.counted(movies.values(), name + ".rows_scanned"), ratings))
+    return rollups
+
+
+def print_stats(results: list) -> None:
+    """
+    Writes the statistics found by find_stats to the output, or that there was no match if there are none.
+    :param results: The list of statistics tuples
+    :return: None
+    """
+    sink.stats(results)
+
 
+def print_histogram(results: list) -> None:
+    """
+    Writes the ranges and their number of titles found by find_histogram to the output, or that there was no match
+    if there are none.
+    :param results: The list of (lowest, highest, titles) tuples
+    :return: None
+    """
+    sink.histogram(results)
+
+
+def stats(movie_type: str, genre: str, begin_year: int, stop_year: int, movies: dict, ratings: dict) -> None:
+    """
+    Prints the statistics of the titles of a type and genre for every year between the start and end years
+    (inclusive) and for all of them (see find_stats).
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param genre: One of the genres of the movies, or ALL for every movie
+    :param begin_year: The year to begin at (inclusive)
+    :param stop_year: The year to stop at (inclusive)
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :return: None
+    """
+    sink.begin("STATS", movie_type, genre, begin_year, stop_year)
+    start = timer()  # Starts timing
+    with instrument.span("STATS.find"):
+        results = cached(("STATS", movie_type, genre, begin_year, stop_year),
+                         lambda: find_stats(movie_type, genre, begin_year, stop_year, movies, ratings))
+    with instrument.span("STATS.format"):
+        print_stats(results)
     elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
-    print("elapsed time (s):", elapsed)
+    with instrument.span("STATS.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
 
 
-def get_queries(movies: dict, ratings: dict) -> None:
-    for query in sys.stdin:
-        query = query.strip().split(" ")
+def histogram(movie_type: str, field: str, buckets: int, movies: dict, ratings: dict) -> None:
+    """
+    Prints how many titles of a type are in each of some equal ranges of a field (see find_histogram).
+    :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :param field: rating, votes, runtime or year
+    :param buckets: The number of ranges to count the titles in
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :return: None
+    """
+    sink.begin("HISTOGRAM", movie_type, field, buckets)
+    start = timer()  # Starts timing
+    with instrument.span("HISTOGRAM.find"):
+        results = cached(("HISTOGRAM", movie_type, field, buckets),
+                         lambda: find_histogram(movie_type, field, buckets, movies, ratings))
+    with instrument.span("HISTOGRAM.format"):
+        print_histogram(results)
+    elapsed = timer() - start  # Finds elapsed time from when the start variable was made until now
+    with instrument.span("HISTOGRAM.write"):
+        sink.end(elapsed)  # Writes out the results along with the elapsed time
+
+
+def parse_query(line: str):
+    """
+    Splits a line of the query file into the name of the query and its arguments.
+    :param line: The line from the query file
+    :return: A tuple of the query name and its arguments as the query functions take them, or None if the line isn't
+                a known query
+    """
+    query = line.strip().split(" ")
+    if query[0] == "LOOKUP":
+        return "LOOKUP", query[1]
+    elif query[0] == "CONTAINS":
+        return "CONTAINS", query[1], " ".join(query[2:])
+    elif query[0] == "YEAR_AND_GENRE":
+        return "YEAR_AND_GENRE", query[1], int(query[2]), query[3]
+    elif query[0] == "RUNTIME":
+        return "RUNTIME", query[1], int(query[2]), int(query[3])
+    elif query[0] == "MOST_VOTES":
+        return "MOST_VOTES", query[1], int(query[2])
+    elif query[0] == "TOP":
+        return "TOP", query[1], int(query[2]), int(query[3]), int(query[4])
+    elif query[0] == "STATS":
+        return "STATS", query[1], query[2], int(query[3]), int(query[4])
+    elif query[0] == "HISTOGRAM":
+        if query[2] not in FIELDS:
+            raise ValueError("HISTOGRAM can't count titles by " + query[2])
+        return "HISTOGRAM", query[1], query[2], int(query[3])
+    return None
+
+
+def perform(query: tuple, movies: dict, ratings: dict, index=None) -> None:
+    """
+    Performs one parsed query and prints its results.
+    :param query: The tuple given by parse_query
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    # Runs the query under cProfile if queries of its kind are being profiled
+    with instrument.profiled(query[0]):
         if query[0] == "LOOKUP":
             lookup(query[1], movies, ratings)
         elif query[0] == "CONTAINS":
-            contains(query[1], " ".join(query[2:]), movies)
+            contains(*query[1:], movies, index)
         elif query[0] == "YEAR_AND_GENRE":
-            year_and_genre(query[1], int(query[2]), query[3], movies)
+            year_and_genre(*query[1:], movies, index)
         elif query[0] == "RUNTIME":
-            runtime(query[1], int(query[2]), int(query[3]), movies)
+            runtime(*query[1:], movies, index)
         elif query[0] == "MOST_VOTES":
-            most_votes(query[1], int(query[2]), movies, ratings)
+            most_votes(*query[1:], movies, ratings, index)
         elif query[0] == "TOP":
-            top(query[1], int(query[2]), int(query[3]), int(query[4]), movies, ratings)
+            top(*query[1:], movies, ratings, index)
+        elif query[0] == "STATS":
+            stats(*query[1:], movies, ratings)
+        elif query[0] == "HISTOGRAM":
+            histogram(*query[1:], movies, ratings)
+
+
+def get_queries(movies: dict, ratings: dict, index=None, queries=None) -> None:
+    """
+    Performs each query, one per line, from standard input or the given lines.
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param queries: The lines of queries to perform, or None to read them from standard input
+    :return: None
+    """
+    for line in sys.stdin if queries is None else queries:
+        with instrument.span("parse"):
+            query = parse_query(line)
+        if query is not None:
+            perform(query, movies, ratings, index)
@@ -0,0 +1,204 @@
+"""
+Benchmarks the program on synthetic datasets of different sizes. For each number of titles it generates a basics
+and ratings file with synthetic_data (unless they were already generated), then in a separate process loads them,
+performs every query in input/*.txt and measures how long loading took, the latency of each query, how many queries
+per second were performed and the peak memory the process used. The results go to a JSON report so runs can be
+compared, along with a short table on standard output.
+
+Each size is measured in its own process so the peak memory of one doesn't count towards the next.
+
+$ python3 src/benchmark.py 10000 100000 1000000 --indexes --report benchmark.json
+
+Author: Luke Chelius
+"""
+import argparse  # ArgumentParser
+import glob
+import indexes  # MovieIndex
+import json
+import os
+import platform
+import Queries  # parse_query, perform, set_output
+import read_files  # read_f
+import subprocess
+import sys  # argv, executable
+import synthetic_data  # generate
+import time
+from contextlib import redirect_stdout
+from output import TextSink
+from timeit import default_timer as timer
+
+try:
+    import resource  # Not on Windows
+except ImportError:
+    resource = None
+
+PERCENTILES = (50, 90, 99)
+
+
+def read_queries(pattern: str = "input/*.txt") -> list:
+    """
+    Reads the queries from the query files, each different one once.
+    :param pattern: The glob pattern of the query files
+    :return: A list of the query lines in the order they were first found
+    """
+    queries = {}  # Used as an ordered set
+    for file in sorted(glob.glob(pattern)):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    queries[line.strip()] = None
+    return list(queries)
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Finds a percentile of some values with the nearest rank method.
+    :param values: The values, sorted
+    :param percent: The percentile, between 0 and 100
+    :return: The value at that percentile, 0.0 if there are none
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * percent // 100))  # Rounds up
+    return values[int(rank) - 1]
+
+
+def summarize(latencies: list) -> dict:
+    """
+    Works out the statistics for the latencies of some queries.
+    :param latencies: The time each query took in seconds
+    :return: A dictionary of the count, total, mean, percentiles, maximum and queries per second
+    """
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    summary = {"count": len(latencies), "total_s": total, "mean_s": total / len(latencies) if latencies else 0.0}
+    for percent in PERCENTILES:
+        summary["p%d_s" % percent] = percentile(latencies, percent)
+    summary["max_s"] = latencies[-1] if latencies else 0.0
+    summary["queries_per_s"] = len(latencies) / total if total > 0 else 0.0
+    return summary
+
+
+def peak_rss() -> int:
+    """
+    Finds the most memory this process has used.
+    :return: The peak resident set size in bytes, or None where it can't be found
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux gives it in KiB, macOS in bytes
+
+
+def measure(files: tuple, queries: list, columnar: bool = False, use_indexes: bool = False, repeat: int = 1) -> dict:
+    """
+    Loads a dataset and performs the queries on it, timing everything. The query results are formatted as usual but
+    thrown away.
+    :param files: The names of the basics and ratings files
+    :param queries: The query lines
+    :param columnar: True to load into stores, False to load into dictionaries
+    :param use_indexes: True to build the indexes before performing the queries
+    :param repeat: The number of times to perform every query
+    :return: A dictionary of the measurements
+    """
+    load = {}
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = timer()
+        movies = read_files.read_f(files[0], True, columnar=columnar)
+        load["basics_s"] = timer() - start
+        start = timer()
+        ratings = read_files.read_f(files[1], False, movies, columnar)
+        load["ratings_s"] = timer() - start
+        index = None
+        if use_indexes:
+            start = timer()
+            index = indexes.MovieIndex(movies, ratings)
+            load["indexes_s"] = timer() - start
+        load["total_s"] = sum(load.values())
+
+        Queries.set_output(TextSink(devnull))
+        latencies = {}  # Name of the query to the time each one of that kind took
+        start = timer()
+        for _ in range(repeat):
+            for query in map(Queries.parse_query, queries):
+                if query is None:
+                    continue
+                started = timer()
+                Queries.perform(query, movies, ratings, index)
+                latencies.setdefault(query[0], []).append(timer() - started)
+        elapsed = timer() - start
+
+    return {"titles": len(movies), "ratings": len(ratings), "load": load,
+            "queries": {name: summarize(times) for name, times in latencies.items()},
+            "all_queries": summarize([latency for times in latencies.values() for latency in times]),
+            "wall_queries_per_s": sum(map(len, latencies.values())) / elapsed if elapsed > 0 else 0.0,
+            "peak_rss_bytes": peak_rss()}
+
+
+def run_scale(rows: int, data_dir: str, options: argparse.Namespace) -> dict:
+    """
+    Measures one size of dataset in a separate process, generating its files first if needed.
+    :param rows: The number of titles
+    :param data_dir: The directory the generated files are kept in
+    :param options: The options given on the command line
+    :return: The dictionary of measurements given by measure, with the number of rows added
+    """
+    files = (os.path.join(data_dir, "synthetic-%d.basics.tsv" % rows),
+             os.path.join(data_dir, "synthetic-%d.ratings.tsv" % rows))
+    if not all(map(os.path.exists, files)):
+        os.makedirs(data_dir, exist_ok=True)
+        print("generating", rows, "titles...")
+        start = timer()
+        synthetic_data.generate(rows, *files, options.seed)
+        print("elapsed time (s):", timer() - start)
+
+    print("measuring", rows, "titles...")
+    command = [sys.executable, os.path.abspath(__file__), "--measure", *files, "--queries", options.queries,
+               "--repeat", str(options.repeat)]
+    command += ["--columnar"] * options.columnar + ["--indexes"] * options.indexes
+    result = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+    result["rows"] = rows
+    return result
+
+
+def main(args=sys.argv):
+    parser = argparse.ArgumentParser(description="Benchmarks loading and querying synthetic datasets.")
+    parser.add_argument("scales", type=int, nargs="*", default=[10000, 100000],
+                        help="numbers of titles to generate and measure (default 10000 100000)")
+    parser.add_argument("--columnar", action="store_true", help="load into column based stores")
+    parser.add_argument("--indexes", action="store_true", help="build the indexes before performing the queries")
+    parser.add_argument("--queries", default="input/*.txt", help="glob pattern of the query files")
+    parser.add_argument("--repeat", type=int, default=1, help="number of times to perform every query")
+    parser.add_argument("--data-dir", default="data", help="directory to keep the generated files in")
+    parser.add_argument("--seed", type=int, default=140, help="seed for generating the datasets")
+    parser.add_argument("--report", default="benchmark.json", help="file to write the JSON report to")
+    parser.add_argument("--measure", nargs=2, metavar=("BASICS", "RATINGS"), help=argparse.SUPPRESS)
+    options = parser.parse_args(args[1:])
+
+    queries = read_queries(options.queries)
+    # Measures one dataset and gives back the results to the process that started this one
+    if options.measure is not None:
+        print(json.dumps(measure(tuple(options.measure), queries, options.columnar, options.indexes,
+                                 options.repeat)))
+        return
+
+    report = {"started": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+              "platform": platform.platform(), "columnar": options.columnar, "indexes": options.indexes,
+              "repeat": options.repeat, "queries": len(queries), "scales": []}
+    for rows in options.scales:
+        report["scales"].append(run_scale(rows, options.data_dir, options))
+    with open(options.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    print("titles", "load (s)", "queries/s", "p50 (ms)", "p99 (ms)", "peak RSS (MiB)", sep="\t")
+    for result in report["scales"]:
+        peak = result["peak_rss_bytes"]
+        print(result["rows"], round(result["load"]["total_s"], 3), round(result["wall_queries_per_s"], 1),
+              round(result["all_queries"]["p50_s"] * 1000, 3), round(result["all_queries"]["p99_s"] * 1000, 3),
+              "-" if peak is None else round(peak / 2 ** 20, 1), sep="\t")
+    print("\nreport written to", options.report)
+
+
+if __name__ == '__main__':
+    main()
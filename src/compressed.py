@@ -0,0 +1,153 @@
+"""
+Opens dataset files that are compressed the way IMDB distributes them (title.basics.tsv.gz), or with bzip2 or
+Zstandard, so they don't have to be decompressed to disk before every load. The file is decompressed in a separate
+thread in large blocks that are handed to the reading thread through a small queue, so the next blocks are being
+decompressed while the lines of the last one are parsed. zlib and bz2 let go of the GIL while they decompress, which
+is what lets the two actually overlap. Plain files are opened as usual.
+
+Zstandard needs the zstandard package, which is only imported when a .zst file is opened.
+
+Author: Luke Chelius
+"""
+import bz2
+import gzip
+import io
+import os
+import queue
+import threading
+
+try:
+    import zstandard  # Not part of the standard library
+except ImportError:
+    zstandard = None
+
+BLOCK_SIZE = 1 << 20  # Bytes decompressed at a time
+QUEUE_BLOCKS = 8  # The most decompressed blocks waiting to be read
+SUFFIXES = (".gz", ".bz2", ".zst")  # The compressed formats that can be read
+
+
+def is_compressed(file: str) -> bool:
+    """
+    Checks if a file is compressed, going by its name.
+    :param file: The name of the file
+    :return: True if it ends with one of the SUFFIXES
+    """
+    return file.endswith(SUFFIXES)
+
+
+def find_dataset(file: str) -> str:
+    """
+    Finds a dataset file, or a compressed copy of it if the file itself isn't there.
+    :param file: The name of the plain tsv file
+    :return: The name of the file, or of the first compressed copy that exists (e.g. file + ".gz"), or the file again
+                if there are none
+    """
+    if os.path.exists(file):
+        return file
+    for suffix in SUFFIXES:
+        if os.path.exists(file + suffix):
+            return file + suffix
+    return file
+
+
+def _open_binary(file: str):
+    """
+    Opens a compressed file for reading the decompressed bytes.
+    :param file: The name of the file
+    :return: A binary file object
+    """
+    if file.endswith(".gz"):
+        return gzip.open(file, "rb")
+    if file.endswith(".bz2"):
+        return bz2.open(file, "rb")
+    if zstandard is None:
+        raise ImportError("reading " + file + " needs the zstandard package")
+    return zstandard.ZstdDecompressor().stream_reader(open(file, "rb"), read_size=BLOCK_SIZE, closefd=True)
+
+
+class _Decompressor(io.RawIOBase):
+    """
+    A raw stream of the decompressed bytes of a file, decompressed ahead of time in a separate thread.
+    """
+
+    def __init__(self, source):
+        """
+        Starts decompressing.
+        :param source: The binary file object that decompresses when read
+        """
+        super().__init__()
+        self._blocks = queue.Queue(QUEUE_BLOCKS)
+        self._block = memoryview(b"")  # What's left of the block being read
+        self._ended = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._decompress, args=(source,), daemon=True)
+        self._thread.start()
+
+    def _decompress(self, source) -> None:
+        """
+        Decompresses the whole file into the queue, ending with an empty block, or with the error if one happens.
+        Runs in the decompressing thread.
+        :param source: The binary file object that decompresses when read
+        :return: None
+        """
+        try:
+            with source:
+                block = source.read(BLOCK_SIZE)
+                while block and self._put(block):
+                    block = source.read(BLOCK_SIZE)
+            self._put(b"")
+        except Exception as error:
+            self._put(error)
+
+    def _put(self, block) -> bool:
+        """
+        Waits for room in the queue for a block, giving up if the stream is closed first.
+        :param block: The bytes, or an exception
+        :return: True if the block was put in the queue
+        """
+        while not self._stopped.is_set():
+            try:
+                self._blocks.put(block, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._block:
+            if self._ended:
+                return 0
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                self._ended = True
+                raise block
+            if not block:
+                self._ended = True
+                return 0
+            self._block = memoryview(block)
+        size = min(len(buffer), len(self._block))
+        buffer[:size] = self._block[:size]
+        self._block = self._block[size:]
+        return size
+
+    def close(self) -> None:
+        # Stops the decompressing thread if the file wasn't read to the end
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        super().close()
+
+
+def open_text(file: str):
+    """
+    Opens a dataset file for reading its lines, decompressing it in a separate thread if it's compressed.
+    :param file: The name of the file
+    :return: A text file object, read the same way as open(file, encoding="utf-8") would read the plain file
+    """
+    if not is_compressed(file):
+        return open(file, encoding="utf-8")
+    reader = io.BufferedReader(_Decompressor(_open_binary(file)), BLOCK_SIZE)
+    return io.TextIOWrapper(reader, encoding="utf-8")
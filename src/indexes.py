@@ -0,0 +1,220 @@
+"""
+Secondary indexes over the movies so the queries only look at the titles that could match instead of every title in
+the dataset. The index is built once after the movies are read and partitions the titles by type, by type and start
+year, by genre, and keeps the titles of each type sorted by runtime. It also holds the Rankings used by MOST_VOTES
+and TOP and the TitleSearch used by CONTAINS. Titles are kept as their position in the movies
+dictionary (or their row in a MovieStore) and always handed back in that order, so the queries find the same titles
+in the same order as when they go through the whole dictionary.
+
+The index of a dictionary can be kept up to date as movies are inserted, changed and deleted (see refresh). A
+changed movie keeps its position and an inserted one gets the next position after all the others, the same place it
+goes in the dictionary, while a deleted movie's position is left empty so no other position has to move.
+
+Author: Luke Chelius
+"""
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+import instrument  # add_span, count, counted, span
+from movie_store import movie_rows
+from rankings import Rankings
+from title_search import TitleSearch
+from timeit import default_timer as timer
+
+
+class MovieIndex:
+    """
+    Indexes for finding the movies of a type by start year, genre or runtime.
+    """
+
+    def __init__(self, movies, ratings=None, titles=None):
+        """
+        Builds the indexes for a dictionary of movies or a MovieStore, and the rankings if the ratings are given.
+        :param movies: The dictionary (or MovieStore) containing all the titles from the movie dataset
+        :param ratings: The dictionary (or RatingStore) containing all the ratings from the rating dataset
+        :param titles: The TitleSearch for the movies if it was loaded from a snapshot, otherwise it's built
+        """
+        print("building indexes...")
+        start = timer()  # Starts timing
+        values, self._movie = movie_rows(movies)
+        self._rows = values if isinstance(values, list) else None  # Movie at each position, if it can change
+        self._positions = None  # Tconst to position, made the first time the movies change
+        self.by_type = {}  # Type to the positions of the titles of that type
+        self.by_type_year = {}  # (type, start year) to the positions of those titles
+        self.by_genre = {}  # Genre to the positions of the titles with that genre
+        by_runtime = {}  # Type to a list of (runtime, position) for the titles of that type
+
+        with instrument.span("index.partitions"):
+            for position, movie in enumerate(instrument.counted(values, "index.rows_scanned")):
+                self.by_type.setdefault(movie.title_type, array("I")).append(position)
+                self.by_type_year.setdefault((movie.title_type, movie.start_year), array("I")).append(position)
+                for genre in movie.genres.split(","):
+                    self.by_genre.setdefault(genre, array("I")).append(position)
+                by_runtime.setdefault(movie.title_type, []).append((movie.run_time_mins, position))
+
+            # Type to a tuple of the sorted runtimes and the positions of the titles they belong to
+            self.runtimes = {}
+            for title_type, pairs in by_runtime.items():
+                pairs.sort()
+                self.runtimes[title_type] = (array("I", (pair[0] for pair in pairs)),
+                                             array("I", (pair[1] for pair in pairs)))
+            instrument.count("index.sort_calls", len(by_runtime))
+        # Used by MOST_VOTES and TOP, with the same positions as the rest of the index
+        rows = None if self._rows is None else (self._rows, self._movie)
+        with instrument.span("index.rankings"):
+            self.rankings = None if ratings is None else Rankings(movies, ratings, rows)
+        with instrument.span("index.titles"):
+            self.titles = TitleSearch.build(movies) if titles is None else titles  # Used by CONTAINS
+
+        elapsed = timer() - start  # Finds the elapsed time
+        instrument.add_span("index.build", elapsed)
+        print("elapsed time (s):", elapsed)
+
+    def movies(self, positions):
+        """
+        Gets the movies at some positions.
+        :param positions: The positions of the movies
+        :return: An iterator of the Movie objects
+        """
+        return map(self._movie, positions)
+
+    def of_type(self, movie_type: str):
+        """
+        Finds all the movies of a type.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :return: An iterator of the Movie objects in dictionary order
+        """
+        return self.movies(self.by_type.get(movie_type, ()))
+
+    def of_type_containing(self, movie_type: str, words: str):
+        """
+        Finds the movies of a type whose primary title could contain some words, using the trigram index.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param words: The words being looked for
+        :return: An iterator of the Movie objects in dictionary order, which still need checking for the words
+        """
+        positions = self.titles.find(movie_type, words)
+        return self.of_type(movie_type) if positions is None else self.movies(positions)
+
+    def of_type_years(self, movie_type: str, begin_year: int, stop_year: int):
+        """
+        Finds the movies of a type that started between two years (inclusive).
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param begin_year: The first start year to include
+        :param stop_year: The last start year to include
+        :return: An iterator of the Movie objects in dictionary order
+        """
+        buckets = (self.by_type_year.get((movie_type, year), ()) for year in range(begin_year, stop_year + 1))
+        return self.movies(merge(*buckets))
+
+    def of_type_year_genre(self, movie_type: str, year: int, genre: str):
+        """
+        Finds the movies of a type that started in a year and whose genres contain some text. The (type, year) list
+        is used unless the genre lists it could be in are shorter.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param year: The start year of the movies
+        :param genre: The text to find in the genres, usually a single genre
+        :return: An iterator of the Movie objects in dictionary order
+        """
+        bucket = self.by_type_year.get((movie_type, year), ())
+        # A genre without a comma can only be found inside one of the comma separated genres
+        if "," not in genre:
+            postings = [positions for name, positions in self.by_genre.items() if genre in name]
+            if sum(map(len, postings)) < len(bucket):
+                found = self.movies(sorted(set().union(*postings)))
+                return (movie for movie in found if movie.title_type == movie_type and movie.start_year == year)
+        return (movie for movie in self.movies(bucket) if genre in movie.genres)
+
+    def of_type_runtime(self, movie_type: str, min_mins: int, max_mins: int):
+        """
+        Finds the movies of a type with a runtime between a minimum and maximum (inclusive) with a binary search.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param min_mins: The minimum runtime for the movie
+        :param max_mins: The maximum runtime for the movie
+        :return: An iterator of the Movie objects in dictionary order
+        """
+        runtimes, positions = self.runtimes.get(movie_type, ((), ()))
+        first = bisect_left(runtimes, min_mins)
+        last = bisect_right(runtimes, max_mins)
+        return self.movies(sorted(positions[first:last]))
+
+    def _position(self, tconst: str) -> int:
+        """
+        Finds the position of a movie, making the lookup table the first time it's needed.
+        :param tconst: The tconst of the movie
+        :return: The position
+        """
+        if self._rows is None:
+            raise TypeError("only the index of a dictionary of movies can be changed")
+        if self._positions is None:
+            self._positions = {movie.movie_id: position for position, movie in enumerate(self._rows)
+                               if movie is not None}
+        return self._positions[tconst]
+
+    def discard(self, movie, rating=None) -> None:
+        """
+        Takes a movie out of the indexes before it's changed or deleted.
+        :param movie: The Movie object as it was indexed
+        :param rating: Its Rating object as it was indexed, or None if it wasn't rated
+        :return: None
+        """
+        position = self._position(movie.movie_id)
+        _remove(self.by_type[movie.title_type], position)
+        _remove(self.by_type_year[(movie.title_type, movie.start_year)], position)
+        for genre in movie.genres.split(","):
+            _remove(self.by_genre[genre], position)
+        runtimes, positions = self.runtimes[movie.title_type]
+        i = bisect_left(positions, position, bisect_left(runtimes, movie.run_time_mins),
+                        bisect_right(runtimes, movie.run_time_mins))
+        del runtimes[i]
+        del positions[i]
+        self.titles.discard(position, movie)
+        if self.rankings is not None and rating is not None:
+            self.rankings.discard(position, movie, rating)
+
+    def forget(self, tconst: str) -> None:
+        """
+        Empties the position of a deleted movie once it has been discarded.
+        :param tconst: The tconst of the movie
+        :return: None
+        """
+        self._rows[self._position(tconst)] = None
+        del self._positions[tconst]
+
+    def add(self, movie, rating=None) -> None:
+        """
+        Puts a changed movie back into the indexes, or an inserted movie at the next position. The dictionaries of
+        movies and ratings have to hold the movie and rating already.
+        :param movie: The Movie object
+        :param rating: Its Rating object, or None if it isn't rated
+        :return: None
+        """
+        try:
+            position = self._position(movie.movie_id)
+            self._rows[position] = movie
+        except KeyError:  # Inserted
+            position = len(self._rows)
+            self._rows.append(movie)
+            self._positions[movie.movie_id] = position
+        insort(self.by_type.setdefault(movie.title_type, array("I")), position)
+        insort(self.by_type_year.setdefault((movie.title_type, movie.start_year), array("I")), position)
+        for genre in movie.genres.split(","):
+            insort(self.by_genre.setdefault(genre, array("I")), position)
+        runtimes, positions = self.runtimes.setdefault(movie.title_type, (array("I"), array("I")))
+        i = bisect_left(positions, position, bisect_left(runtimes, movie.run_time_mins),
+                        bisect_right(runtimes, movie.run_time_mins))
+        runtimes.insert(i, movie.run_time_mins)
+        positions.insert(i, position)
+        self.titles.add(position, movie)
+        if self.rankings is not None and rating is not None:
+            self.rankings.add(position, movie, rating)
+
+
+def _remove(positions: array, position: int) -> None:
+    """
+    Removes a position from a sorted array of positions with a binary search.
+    :param positions: The sorted positions
+    :param position: The position to remove
+    :return: None
+    """
+    del positions[bisect_left(positions, position)]
@@ -0,0 +1,202 @@
+"""
+Measures where the time goes while the dataset is read and the queries are performed, without changing what is
+printed. Spans time the phases of the work (parsing the query, filtering the movies, sorting, formatting and
+writing the results) and counters keep track of how much work was done (rows scanned, rows matched, sort calls).
+Both are named after the query they belong to, like "TOP.filter" or "RUNTIME.rows_scanned", and summed up over the
+whole run. When the switch is on the totals are written to standard error at the end, as a table or as JSON.
+
+The queries of one kind can also be run under cProfile, with the profile written to standard error at the end.
+
+Everything here does nothing until enable or profile is called, so leaving the calls in costs very little. The
+spans and counters recorded in query_pool's workers are taken after each query and merged into the totals of the main
+process, but the queries they perform aren't profiled.
+
+Author: Luke Chelius
+"""
+import cProfile
+import json
+import pstats
+import sys  # stderr
+from timeit import default_timer as timer
+
+enabled = False  # True once spans and counters are being recorded
+spans = {}  # Span name to a list of the number of times it ran and the total seconds
+counters = {}  # Counter name to its total
+_profiles = {}  # Query name (or "all") to the cProfile.Profile its queries run under
+
+
+class _Span:
+    """
+    Times a block of code and adds the time to its span when it ends.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, *error):
+        total = spans.setdefault(self.name, [0, 0.0])
+        total[0] += 1
+        total[1] += timer() - self.start
+        return False
+
+
+class _Nothing:
+    """
+    Stands in for a span or profile when nothing is being recorded.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        return False
+
+
+_NOTHING = _Nothing()
+
+
+def enable() -> None:
+    """
+    Starts recording spans and counters.
+    :return: None
+    """
+    global enabled
+    enabled = True
+
+
+def span(name: str):
+    """
+    Times a block of code, for use in a with statement.
+    :param name: The name of the span, e.g. "CONTAINS.filter"
+    :return: A context manager that records the time if recording is on
+    """
+    return _Span(name) if enabled else _NOTHING
+
+
+def add_span(name: str, seconds: float) -> None:
+    """
+    Adds a time measured elsewhere to a span if recording is on.
+    :param name: The name of the span, e.g. "read.basics"
+    :param seconds: The time in seconds
+    :return: None
+    """
+    if enabled:
+        total = spans.setdefault(name, [0, 0.0])
+        total[0] += 1
+        total[1] += seconds
+
+
+def count(name: str, amount: int = 1) -> None:
+    """
+    Adds to a counter if recording is on.
+    :param name: The name of the counter, e.g. "TOP.sort_calls"
+    :param amount: The amount to add
+    :return: None
+    """
+    if enabled:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def take() -> tuple:
+    """
+    Takes the spans and counters recorded so far and starts them again from nothing, e.g. to send them from a worker
+    process to be merged into the totals of the main one.
+    :return: A tuple of the spans and counters, in the same form as the module's spans and counters
+    """
+    recorded = {name: list(total) for name, total in spans.items()}, dict(counters)
+    spans.clear()
+    counters.clear()
+    return recorded
+
+
+def merge(recorded: tuple) -> None:
+    """
+    Adds spans and counters recorded elsewhere to the totals.
+    :param recorded: A tuple of the spans and counters, as given by take
+    :return: None
+    """
+    for name, (number, seconds) in recorded[0].items():
+        total = spans.setdefault(name, [0, 0.0])
+        total[0] += number
+        total[1] += seconds
+    for name, amount in recorded[1].items():
+        counters[name] = counters.get(name, 0) + amount
+
+
+def counted(rows, name: str):
+    """
+    Counts the rows of an iterable as they are gone through, if recording is on.
+    :param rows: The iterable
+    :param name: The name of the counter to add to
+    :return: The iterable itself if recording is off, otherwise an iterator that counts
+    """
+    if not enabled:
+        return rows
+    return _counting(rows, name)
+
+
+def _counting(rows, name: str):
+    """
+    Goes through some rows and adds how many there were to a counter at the end.
+    :param rows: The iterable
+    :param name: The name of the counter
+    :return: A generator of the rows
+    """
+    number = 0
+    try:
+        for number, row in enumerate(rows, 1):
+            yield row
+    finally:
+        counters[name] = counters.get(name, 0) + number
+
+
+def profile(kind: str) -> None:
+    """
+    Runs the queries of a kind under cProfile from now on.
+    :param kind: The name of the query, e.g. "TOP", or "all" for every query
+    :return: None
+    """
+    _profiles[kind] = cProfile.Profile()
+
+
+def profiled(kind: str):
+    """
+    Profiles a block of code if the queries of a kind are being profiled, for use in a with statement.
+    :param kind: The name of the query being performed
+    :return: The cProfile.Profile for it, or a context manager that does nothing
+    """
+    return _profiles.get(kind) or _profiles.get("all") or _NOTHING
+
+
+def report(form: str = "table", stream=None) -> None:
+    """
+    Writes the totals of the spans and counters and any profiles.
+    :param form: "table" for a summary table or "json" for a JSON object
+    :param stream: The text stream to write to, standard error if None
+    :return: None
+    """
+    stream = sys.stderr if stream is None else stream
+    if enabled and form == "json":
+        json.dump({"spans": {name: {"count": total[0], "total_s": total[1]} for name, total in sorted(spans.items())},
+                   "counters": dict(sorted(counters.items()))}, stream)
+        stream.write("\n")
+    elif enabled:
+        stream.write("%-32s %10s %14s\n" % ("span", "count", "total (s)"))
+        for name, (number, seconds) in sorted(spans.items()):
+            stream.write("%-32s %10d %14.6f\n" % (name, number, seconds))
+        stream.write("%-32s %10s\n" % ("counter", "total"))
+        for name, total in sorted(counters.items()):
+            stream.write("%-32s %10d\n" % (name, total))
+
+    for kind, profiler in _profiles.items():
+        stream.write("\nprofile of " + kind + " queries:\n")
+        profiler.create_stats()
+        if not profiler.stats:
+            stream.write("no queries were profiled\n")
+            continue
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(25)
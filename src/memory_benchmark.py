@@ -0,0 +1,49 @@
+"""
+Compares how much memory the movies and ratings take up as dictionaries of Movie and Rating objects and as column
+based MovieStore and RatingStore objects. Each one is read from the dataset files while tracemalloc counts the
+memory that is still allocated once reading is done.
+
+$ python3 src/memory_benchmark.py small
+
+Author: Luke Chelius
+"""
+import read_files  # read_f
+import sys  # argv
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+
+
+def measure(files: tuple, columnar: bool) -> tuple:
+    """
+    Reads the dataset and finds how much memory the result holds on to.
+    :param files: The names of the basics and ratings files
+    :param columnar: True to read into stores, False to read into dictionaries
+    :return: A tuple of the bytes held by the movies, the bytes held by the ratings, and the number of each
+    """
+    tracemalloc.start()
+    with redirect_stdout(StringIO()):  # Hides the output from read_f
+        movies = read_files.read_f(files[0], True, columnar=columnar)
+        movie_bytes = tracemalloc.get_traced_memory()[0]
+        ratings = read_files.read_f(files[1], False, movies, columnar)
+    rating_bytes = tracemalloc.get_traced_memory()[0] - movie_bytes
+    tracemalloc.stop()
+    return movie_bytes, rating_bytes, len(movies), len(ratings)
+
+
+def main(args=sys.argv):
+    # Determines whether to use the big or small datasets
+    if len(args) > 1:
+        files = ("data/small.basics.tsv", "data/small.ratings.tsv")
+    else:
+        files = ("data/title.basics.tsv", "data/title.ratings.tsv")
+
+    print("representation", "movies (MiB)", "ratings (MiB)", "bytes per movie", "bytes per rating", sep="\t")
+    for name, columnar in (("dict", False), ("store", True)):
+        movie_bytes, rating_bytes, num_movies, num_ratings = measure(files, columnar)
+        print(name, round(movie_bytes / 2 ** 20, 2), round(rating_bytes / 2 ** 20, 2),
+              round(movie_bytes / max(num_movies, 1), 1), round(rating_bytes / max(num_ratings, 1), 1), sep="\t")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,524 @@
+"""
+Column based stores for the movies and ratings. Instead of one frozen Movie or Rating object per title, every field
+is kept in its own typed array: the numbers as machine ints, the title types and genre lists as small codes into a
+table, and both titles in one string pool that keeps each different title once. Titles are found by the number in
+their tconst. The stores behave like read only dictionaries of tconst to Movie or Rating objects, building the
+object when a title is looked up, so the query functions work the same on a store as they do on a dict. Many titles
+can be looked up at once with lookup_rows, which uses NumPy for the searches if it is installed.
+
+Author: Luke Chelius
+"""
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from itertools import compress, islice, repeat
+from Movies import Movie
+from Ratings import Rating
+import operator
+
+try:
+    import numpy as np  # Not part of the standard library
+except ImportError:
+    np = None
+
+
+def tconst_number(tconst: str) -> int:
+    """
+    Finds the number in a tconst, i.e. 33467 for tt0033467.
+    :param tconst: The 'serial number' of a certain movie/show on IMDB
+    :return: The number, or -1 if the tconst isn't written the way IMDB writes them
+    """
+    digits = tconst[2:]
+    if not digits.isdigit() or not digits.isascii():
+        return -1
+    number = int(digits)
+    # tconsts have at least 7 digits and no extra leading zeroes past that, so the number gives back the same tconst
+    return number if "tt%07d" % number == tconst else -1
+
+
+def tconst_string(number: int) -> str:
+    """
+    Writes the number of a tconst back as a tconst, i.e. tt0033467 for 33467.
+    :param number: The number from the tconst
+    :return: The tconst
+    """
+    return "tt%07d" % number
+
+
+class StringPool:
+    """
+    Strings packed one after another into a single utf-8 buffer, each followed by a newline (which can't appear in a
+    tsv field), with an array of where each one starts.
+    """
+
+    def __init__(self, data=None, offsets=None):
+        """
+        Makes an empty pool, or one over existing buffers such as the columns of a snapshot.
+        :param data: The packed utf-8 strings
+        :param offsets: The byte offset each string starts at, plus the end of the last one
+        """
+        self.data = bytearray() if data is None else data
+        self.offsets = array("q", [0]) if offsets is None else offsets
+        self._indexes = None  # String to its index for intern, made the first time it's needed and freed by freeze
+
+    def add(self, string: str) -> int:
+        """
+        Adds a string to the end of the pool.
+        :param string: The string to add
+        :return: The index of the string in the pool
+        """
+        self.data += string.encode("utf-8")
+        self.data.append(10)  # "\n"
+        self.offsets.append(len(self.data))
+        return len(self.offsets) - 2
+
+    def intern(self, string: str) -> int:
+        """
+        Finds a string in the pool, adding it only if it isn't there yet, so strings that repeat (like "Episode #1.1")
+        are stored once.
+        :param string: The string to find or add
+        :return: The index of the string in the pool
+        """
+        if self._indexes is None:
+            self._indexes = {}
+            for index, pooled in enumerate(self.to_list()):
+                self._indexes.setdefault(pooled, index)
+        index = self._indexes.get(string)
+        if index is None:
+            index = self._indexes[string] = self.add(string)
+        return index
+
+    def freeze(self) -> None:
+        """
+        Frees the dictionary intern uses to find strings, which takes several times the memory of the pool itself.
+        Interning again still works, it just has to build the dictionary again first.
+        :return: None
+        """
+        self._indexes = None
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.data[self.offsets[index]:self.offsets[index + 1] - 1], "utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def to_list(self) -> list:
+        """
+        Decodes every string in the pool at once, which is much faster than getting them one at a time.
+        :return: A list of the strings in the pool
+        """
+        return str(self.data, "utf-8").split("\n")[:-1]
+
+
+class _CodeTable:
+    """
+    Dictionary encodes a column of strings that repeat a lot (title types, genre lists) as small ints.
+    """
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _Store(Mapping):
+    """
+    The lookup by tconst number shared by the movie and rating stores. IMDB files are sorted by tconst, so as long
+    as titles are added in increasing order the ids array itself is binary searched; any title added out of order
+    is remembered in a small dictionary instead.
+    """
+
+    def __init__(self, ids=None):
+        self._ids = array("i") if ids is None else ids
+        self._sorted_rows = len(self._ids)  # The ids before this row are in increasing order
+        if not all(map(operator.lt, self._ids, islice(self._ids, 1, None))):
+            self._sorted_rows = 1
+            while self._ids[self._sorted_rows - 1] < self._ids[self._sorted_rows]:
+                self._sorted_rows += 1
+        # Number to row for titles added out of order
+        self._extra = {self._ids[row]: row for row in range(self._sorted_rows, len(self._ids))}
+
+    def _row(self, number: int) -> int:
+        """
+        Finds the row a title is stored in.
+        :param number: The number from the title's tconst
+        :return: The row, or -1 if the title isn't in the store
+        """
+        row = bisect_left(self._ids, number, 0, self._sorted_rows)
+        if row < self._sorted_rows and self._ids[row] == number:
+            return row
+        return self._extra.get(number, -1)
+
+    def rows(self, numbers: list) -> list:
+        """
+        Finds the rows of many titles at once. The numbers are probed in sorted order, so each binary search of the
+        ids array starts from where the last one ended instead of from the beginning.
+        :param numbers: The numbers from the tconsts of the titles, as given by tconst_number
+        :return: A list of the row of each title in the same order as the numbers, -1 for the ones not in the store
+        """
+        found = [-1] * len(numbers)
+        row = 0
+        for i in sorted(range(len(numbers)), key=numbers.__getitem__):
+            number = numbers[i]
+            if number < 0:
+                continue
+            row = bisect_left(self._ids, number, row, self._sorted_rows)
+            if row < self._sorted_rows and self._ids[row] == number:
+                found[i] = row
+            else:
+                found[i] = self._extra.get(number, -1)
+        return found
+
+    def _search(self, numbers):
+        """
+        Finds the rows of many titles at once with NumPy.
+        :param numbers: A NumPy array of the numbers from the tconsts of the titles
+        :return: A NumPy array of the row of each title, -1 for the ones not in the store
+        """
+        if self._sorted_rows > 0:
+            ids = np.frombuffer(self._ids, np.intc, self._sorted_rows)
+            rows = np.minimum(np.searchsorted(ids, numbers), self._sorted_rows - 1)
+            rows = np.where(ids[rows] == numbers, rows, -1)
+        else:
+            rows = np.full(len(numbers), -1, np.int64)
+        if self._extra:
+            for i in np.flatnonzero(rows < 0).tolist():
+                rows[i] = self._extra.get(int(numbers[i]), -1)
+        return rows
+
+    def _new_row(self, tconst: str) -> tuple:
+        """
+        Finds the row to put a title in, adding a new row for it if it isn't in the store yet.
+        :param tconst: The tconst of the title
+        :return: A tuple of the row and whether it is a new row
+        """
+        number = tconst_number(tconst)
+        if number < 0:
+            raise ValueError("can't store " + repr(tconst) + " since it isn't a tconst")
+        if self._sorted_rows == len(self._ids) and (not self._ids or self._ids[-1] < number):
+            self._sorted_rows += 1
+        else:
+            row = self._row(number)
+            if row >= 0:
+                return row, False
+            self._extra[number] = len(self._ids)
+        self._ids.append(number)
+        return len(self._ids) - 1, True
+
+    def _get_row(self, tconst) -> int:
+        row = self._row(tconst_number(tconst)) if isinstance(tconst, str) else -1
+        if row < 0:
+            raise KeyError(tconst)
+        return row
+
+    def freeze(self) -> None:
+        """
+        Frees anything only needed while titles are being added, once loading is done.
+        :return: None
+        """
+
+    def __contains__(self, tconst) -> bool:
+        return isinstance(tconst, str) and self._row(tconst_number(tconst)) >= 0
+
+    def __iter__(self):
+        return map(tconst_string, self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class MovieStore(_Store):
+    """
+    Holds the movies from the basics dataset one column per field.
+    """
+
+    def __init__(self, columns=None, tables=None):
+        """
+        Makes an empty store, or one over existing columns such as those of a snapshot.
+        :param columns: The columns given by the columns method of another store
+        :param tables: The code tables given by the tables method of another store
+        """
+        columns = {} if columns is None else columns
+        tables = {} if tables is None else tables
+        super().__init__(columns.get("movie_ids"))
+        self._titles = StringPool(columns.get("titles"), columns.get("title_offsets"))
+        self._primary = columns.get("primary_titles", array("I"))  # Index of each primary title in the pool
+        self._original = columns.get("original_titles", array("I"))  # Index of each original title in the pool
+        self._types = columns.get("title_types", array("B"))
+        self._start = columns.get("start_years", array("H"))
+        self._end = columns.get("end_years", array("H"))
+        self._runtime = columns.get("run_time_mins", array("I"))
+        self._genres = columns.get("genres", array("H"))
+        self._type_table = _CodeTable(tables.get("title_types", ()))
+        self._genre_table = _CodeTable(tables.get("genres", ()))
+
+    def add(self, movie_id: str, title_type: str, primary_title: str, original_title: str, start_year: int,
+            end_year: int, run_time_mins: int, genres: str) -> None:
+        """
+        Adds a movie to the store, or replaces it if its tconst is already there.
+        :param movie_id: The tconst of the movie
+        :param title_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param primary_title: The title the movie is known by
+        :param original_title: The title in the original language
+        :param start_year: The year the movie came out
+        :param end_year: The year a series ended
+        :param run_time_mins: The runtime in minutes
+        :param genres: The comma separated genres
+        :return: None
+        """
+        row, new = self._new_row(movie_id)
+        primary = self._titles.intern(primary_title)
+        original = self._titles.intern(original_title)
+        values = (primary, original, self._type_table.encode(title_type), start_year, end_year, run_time_mins,
+                  self._genre_table.encode(genres))
+        columns = (self._primary, self._original, self._types, self._start, self._end, self._runtime, self._genres)
+        for column, value in zip(columns, values):
+            if new:
+                column.append(value)
+            else:
+                column[row] = value
+
+    def freeze(self) -> None:
+        self._titles.freeze()
+
+    def lookup_fields(self, rows: list) -> list:
+        """
+        Gets the fields LOOKUP shows for many rows at once without building Movie objects.
+        :param rows: The rows of the movies
+        :return: A list of (primary title, type, start year, runtime, genres) tuples in the same order
+        """
+        titles, primary, types, start, runtime, genres = (self._titles, self._primary, self._types, self._start,
+                                                          self._runtime, self._genres)
+        type_values, genre_values = self._type_table.values, self._genre_table.values
+        return [(titles[primary[row]], type_values[types[row]], start[row], runtime[row], genre_values[genres[row]])
+                for row in rows]
+
+    def movie(self, row: int) -> Movie:
+        """
+        Builds the Movie object for a row of the store.
+        :param row: The row of the movie
+        :return: The Movie
+        """
+        return Movie(tconst_string(self._ids[row]), self._type_table.values[self._types[row]],
+                     self._titles[self._primary[row]], self._titles[self._original[row]], self._start[row],
+                     self._end[row], self._runtime[row], self._genre_table.values[self._genres[row]])
+
+    def __getitem__(self, tconst) -> Movie:
+        return self.movie(self._get_row(tconst))
+
+    def values(self):
+        """
+        Goes through every movie in the order they were added, decoding the columns in bulk.
+        :return: An iterator of the Movie objects
+        """
+        ids = ["tt%07d" % number for number in self._ids]
+        titles = self._titles.to_list()
+        return map(Movie, ids, map(self._type_table.values.__getitem__, self._types),
+                   map(titles.__getitem__, self._primary), map(titles.__getitem__, self._original),
+                   self._start, self._end, self._runtime, map(self._genre_table.values.__getitem__, self._genres))
+
+    def of_type(self, title_type: str):
+        """
+        Goes through the movies of one type in the order they were added, only building Movie objects for them.
+        :param title_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :return: An iterator of the Movie objects
+        """
+        code = self._type_table.codes.get(title_type)
+        if code is None:
+            return iter(())
+        return map(self.movie, compress(range(len(self._types)), map(code.__eq__, self._types)))
+
+    def items(self):
+        """
+        Goes through every tconst and movie in the order they were added.
+        :return: An iterator of (tconst, Movie) tuples
+        """
+        return ((movie.movie_id, movie) for movie in self.values())
+
+    def columns(self) -> dict:
+        """
+        Gets the arrays the store is made of, e.g. to save them in a snapshot.
+        :return: A dictionary of column name to array or bytes-like object
+        """
+        return {"movie_ids": self._ids, "titles": self._titles.data, "title_offsets": self._titles.offsets,
+                "primary_titles": self._primary, "original_titles": self._original, "title_types": self._types,
+                "start_years": self._start, "end_years": self._end, "run_time_mins": self._runtime,
+                "genres": self._genres}
+
+    def tables(self) -> dict:
+        """
+        Gets the strings the title type and genre codes stand for.
+        :return: A dictionary of table name to list of strings
+        """
+        return {"title_types": self._type_table.values, "genres": self._genre_table.values}
+
+
+class RatingStore(_Store):
+    """
+    Holds the ratings from the ratings dataset one column per field. IMDB ratings have one decimal place, so they
+    are stored as a count of tenths in a single byte.
+    """
+
+    def __init__(self, columns=None):
+        """
+        Makes an empty store, or one over existing columns such as those of a snapshot.
+        :param columns: The columns given by the columns method of another store
+        """
+        columns = {} if columns is None else columns
+        super().__init__(columns.get("rating_ids"))
+        self._tenths = columns.get("average_ratings", array("B"))
+        self._votes = columns.get("num_votes", array("I"))
+
+    def add(self, movie_id: str, average_rating: float, num_votes: int) -> None:
+        """
+        Adds a rating to the store, or replaces it if its tconst is already there.
+        :param movie_id: The tconst of the rated movie
+        :param average_rating: The average rating out of 10, with one decimal place
+        :param num_votes: The number of votes
+        :return: None
+        """
+        tenths = round(average_rating * 10)
+        if tenths / 10 != average_rating:
+            raise ValueError("can't store rating " + str(average_rating) + " since it isn't in tenths")
+        row, new = self._new_row(movie_id)
+        if new:
+            self._tenths.append(tenths)
+            self._votes.append(num_votes)
+        else:
+            self._tenths[row] = tenths
+            self._votes[row] = num_votes
+
+    def lookup_fields(self, rows: list) -> list:
+        """
+        Gets the fields LOOKUP shows for many rows at once without building Rating objects.
+        :param rows: The rows of the ratings
+        :return: A list of (average rating, votes) tuples in the same order
+        """
+        tenths, votes = self._tenths, self._votes
+        return [(tenths[row] / 10, votes[row]) for row in rows]
+
+    def rating(self, row: int) -> Rating:
+        """
+        Builds the Rating object for a row of the store.
+        :param row: The row of the rating
+        :return: The Rating
+        """
+        return Rating(tconst_string(self._ids[row]), self._tenths[row] / 10, self._votes[row])
+
+    def __getitem__(self, tconst) -> Rating:
+        return self.rating(self._get_row(tconst))
+
+    def values(self):
+        """
+        Goes through every rating in the order they were added.
+        :return: An iterator of the Rating objects
+        """
+        return map(Rating, ["tt%07d" % number for number in self._ids],
+                   map(operator.truediv, self._tenths, repeat(10)), self._votes)
+
+    def items(self):
+        """
+        Goes through every tconst and rating in the order they were added.
+        :return: An iterator of (tconst, Rating) tuples
+        """
+        return ((rating.movie_id, rating) for rating in self.values())
+
+    def columns(self) -> dict:
+        """
+        Gets the arrays the store is made of, e.g. to save them in a snapshot.
+        :return: A dictionary of column name to array
+        """
+        return {"rating_ids": self._ids, "average_ratings": self._tenths, "num_votes": self._votes}
+
+
+def movies_of_type(movies, title_type: str):
+    """
+    Goes through the movies of one type from either a dictionary of movies or a MovieStore, in insertion order.
+    :param movies: The dictionary (or MovieStore) containing all the titles from the movie dataset
+    :param title_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+    :return: An iterator of the Movie objects
+    """
+    if isinstance(movies, MovieStore):
+        return movies.of_type(title_type)
+    return (movie for movie in movies.values() if movie.title_type == title_type)
+
+
+def movie_rows(movies) -> tuple:
+    """
+    Numbers the movies of a dictionary of movies or a MovieStore by their position in it, so other structures can
+    refer to a movie with a small int. For a store the position is the row.
+    :param movies: The dictionary (or MovieStore) containing all the titles from the movie dataset
+    :return: A tuple of an iterator of the Movie objects in order and a function from a position to its Movie
+    """
+    if isinstance(movies, MovieStore):
+        return movies.values(), movies.movie
+    values = list(movies.values())
+    return values, values.__getitem__
+
+
+def lookup_rows(movies: MovieStore, ratings: RatingStore, numbers: list) -> list:
+    """
+    Finds the movie and rating rows of many titles at once. With NumPy both stores are searched for the whole batch
+    with np.searchsorted, otherwise in one pass that probes both stores with the numbers in sorted order and only
+    searches the ratings for the titles that have a movie.
+    :param movies: The MovieStore containing all the titles from the movie dataset
+    :param ratings: The RatingStore containing all the ratings from the rating dataset
+    :param numbers: The numbers from the tconsts of the titles, as given by tconst_number
+    :return: A list of (movie row, rating row) tuples in the same order as the numbers, or None for a title missing
+                either one
+    """
+    if np is not None:
+        wanted = np.array(numbers, np.int64)
+        return [None if movie < 0 or rating < 0 else (movie, rating)
+                for movie, rating in zip(movies._search(wanted).tolist(), ratings._search(wanted).tolist())]
+
+    found = [None] * len(numbers)
+    # The searches of _Store.rows are written out here for both stores at once
+    movie_ids, movie_end, movie_extra = movies._ids, movies._sorted_rows, movies._extra
+    rating_ids, rating_end, rating_extra = ratings._ids, ratings._sorted_rows, ratings._extra
+    movie_row = rating_row = 0
+    for i in sorted(range(len(numbers)), key=numbers.__getitem__):
+        number = numbers[i]
+        if number < 0:
+            continue
+        movie_row = bisect_left(movie_ids, number, movie_row, movie_end)
+        if movie_row < movie_end and movie_ids[movie_row] == number:
+            movie = movie_row
+        else:
+            movie = movie_extra.get(number, -1)
+            if movie < 0:
+                continue
+        rating_row = bisect_left(rating_ids, number, rating_row, rating_end)
+        if rating_row < rating_end and rating_ids[rating_row] == number:
+            found[i] = (movie, rating_row)
+        elif number in rating_extra:
+            found[i] = (movie, rating_extra[number])
+    return found
+
+
+def to_stores(movies, ratings) -> tuple:
+    """
+    Copies movies and ratings dictionaries into stores. Stores are given back unchanged.
+    :param movies: The dictionary with the tconst values as the key for each Movie object
+    :param ratings: A dictionary with the tconst values as the key for each Rating object
+    :return: A tuple of the MovieStore and RatingStore
+    """
+    if not isinstance(movies, MovieStore):
+        store = MovieStore()
+        for movie in movies.values():
+            store.add(movie.movie_id, movie.title_type, movie.primary_title, movie.original_title, movie.start_year,
+                      movie.end_year, movie.run_time_mins, movie.genres)
+        store.freeze()
+        movies = store
+    if not isinstance(ratings, RatingStore):
+        store = RatingStore()
+        for rating in ratings.values():
+            store.add(rating.movie_id, rating.average_rating, rating.num_votes)
+        ratings = store
+    return movies, ratings
@@ -7,25 +7,221 @@ types or categories of movies to find and finds them based on the input for each
 
 Author: Luke Chelius
 """
+import argparse  # ArgumentParser
+import bulk_lookup  # run_bulk
+import compressed  # find_dataset
+import indexes  # MovieIndex
+import instrument  # enable, profile, report
+import output  # SINKS
 import read_files  # read_f
-import sys  # argv
-import Queries  # get_queries
+import refresh  # refresh
+import snapshot  # load_snapshot, save_snapshot
+import sys  # argv, stdin
+import Queries  # get_queries, set_cache, set_output
+import query_cache  # ResultCache
+import query_batch  # run_batch
+import query_pool  # run_pool
+import query_server  # serve
+import vectorized  # np, VectorEngine
+from contextlib import redirect_stdout
+from rollups import Rollups
+from timeit import default_timer as timer
+from working_set import WorkingSet
+
+
+def parse_args(args: list) -> argparse.Namespace:
+    """
+    Reads the command line options. Giving any dataset argument at all selects the small dataset.
+    :param args: The command line arguments, including the program name
+    :return: The parsed options
+    """
+    parser = argparse.ArgumentParser(description="Answers IMDB queries read from standard input.")
+    parser.add_argument("dataset", nargs="?", help="use the small dataset if given (e.g. 'small')")
+    parser.add_argument("--snapshot", metavar="PATH",
+                        help="load the dataset from this snapshot file if it is current, otherwise read the tsv "
+                             "files and save a new snapshot there")
+    parser.add_argument("--refresh", action="store_true",
+                        help="with --snapshot, load the snapshot even if the tsv files have changed and only apply "
+                             "the titles and ratings that changed, then save it again")
+    parser.add_argument("--columnar", action="store_true",
+                        help="keep the movies and ratings in column based stores instead of dictionaries")
+    parser.add_argument("--load-workers", type=int, default=0, metavar="N",
+                        help="read the basics and ratings files together in N processes")
+    parser.add_argument("--indexes", action="store_true",
+                        help="index the movies by type, year, genre and runtime and rank them by votes and "
+                             "rating before answering queries")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="answer YEAR_AND_GENRE, RUNTIME, MOST_VOTES and TOP with NumPy arrays of the movies and "
+                             "ratings (ignored if NumPy isn't installed)")
+    parser.add_argument("--working-set", action="store_true",
+                        help="read all the queries first and only load the titles they need")
+    parser.add_argument("--batch", action="store_true",
+                        help="read all the queries first and answer them together, sharing the search through the "
+                             "movies between queries of the same type")
+    parser.add_argument("--query-workers", type=int, default=0, metavar="N",
+                        help="perform the queries in N worker processes that share the loaded dataset")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="keep the dataset loaded and answer queries from clients on ADDRESS (host:port or a "
+                             "Unix socket path) instead of standard input")
+    parser.add_argument("--bulk-lookup", nargs="?", const="-", metavar="FILE",
+                        help="only look up tconsts, one per line (or LOOKUP queries), from FILE or standard input, "
+                             "resolving them in batches and reporting the lookups per second")
+    parser.add_argument("--no-timing", action="store_true",
+                        help="leave the elapsed time of each query out of the results")
+    parser.add_argument("--output", choices=sorted(output.SINKS), default="text",
+                        help="format to write the query results in; with tsv or jsonl everything else that is "
+                             "printed goes to standard error")
+    parser.add_argument("--cache", type=int, default=0, metavar="N",
+                        help="keep the results of the last N different queries so repeats aren't searched again")
+    parser.add_argument("--stats", choices=("table", "json"),
+                        help="time the phases of reading and of each query and count the rows they go through, "
+                             "and write the totals to standard error at the end")
+    parser.add_argument("--profile", metavar="KIND",
+                        help="run the queries of this kind (e.g. TOP, or 'all') under cProfile and write the profile "
+                             "to standard error at the end")
+    options = parser.parse_args(args[1:])
+    if options.working_set and (options.snapshot is not None or options.load_workers > 0):
+        parser.error("--working-set can't be used with --snapshot or --load-workers")
+    if options.refresh and (options.snapshot is None or options.columnar):
+        parser.error("--refresh needs --snapshot and can't be used with --columnar")
+    if options.batch and options.query_workers > 0:
+        parser.error("--batch can't be used with --query-workers")
+    if options.serve is not None and (options.working_set or options.batch or options.query_workers > 0):
+        parser.error("--serve can't be used with --working-set, --batch or --query-workers")
+    if options.bulk_lookup is not None and (options.working_set or options.batch or options.query_workers > 0 or
+                                            options.serve is not None):
+        parser.error("--bulk-lookup can't be used with --working-set, --batch, --query-workers or --serve")
+    if options.serve is not None and options.output != "text":
+        parser.error("--serve only answers in the text format")
+    return options
 
 
 def main(args=sys.argv):
-    # Determines whether to use the big or small datasets
-    if len(args) > 1:
+    options = parse_args(args)
+    if options.stats is not None:
+        instrument.enable()
+    if options.profile is not None:
+        instrument.profile(options.profile)
+    if options.cache > 0:
+        Queries.set_cache(query_cache.ResultCache(options.cache))
+    if options.output == "text":
+        if options.no_timing:
+            Queries.set_output(output.TextSink(timing=False))
+        run(options)
+    else:
+        # Only the results go to standard output so another program can read them
+        Queries.set_output(output.SINKS[options.output](sys.stdout, not options.no_timing))
+        with redirect_stdout(sys.stderr):
+            run(options)
+    if options.stats is not None or options.profile is not None:
+        sys.stdout.flush()
+        instrument.report(options.stats or "table")
+    if Queries.cache is not None:
+        sys.stdout.flush()
+        print("result cache:", ", ".join(name + " " + str(value) for name, value in Queries.cache.stats().items()),
+              file=sys.stderr)
+
+
+def asks_for_rollups(queries: list) -> bool:
+    """
+    Checks if any of some queries is answered from the rollups.
+    :param queries: The lines of the query file
+    :return: True if there is a STATS or HISTOGRAM query
+    """
+    return any(line.strip().split(" ")[0] in ("STATS", "HISTOGRAM") for line in queries)
+
+
+def run(options: argparse.Namespace) -> None:
+    """
+    Loads the dataset and performs the queries the way the options say.
+    :param options: The options given by parse_args
+    :return: None
+    """
+    # Determines whether to use the big or small datasets, reading compressed copies if the tsv files aren't there
+    if options.dataset is not None:
         files = ("data/small.basics.tsv", "data/small.ratings.tsv")
     else:
         files = ("data/title.basics.tsv", "data/title.ratings.tsv")
+    files = tuple(map(compressed.find_dataset, files))
 
-    movies = read_files.read_f(files[0], True)  # Reads the data from the movie file to a dict
-    print()
-    ratings = read_files.read_f(files[1], False, movies)  # Reads the data from the ratings file to a dict
+    queries = None
+    loaded = None
+    if options.snapshot is not None:
+        # Skips reading the tsv files if the snapshot is current
+        loaded = snapshot.load_snapshot(options.snapshot, files, options.columnar, options.refresh)
+    if loaded is not None:
+        movies, ratings, titles, current, hashes = loaded
+    elif options.working_set:
+        # Reads the queries first to only load the titles they need
+        queries = sys.stdin.readlines()
+        movies, ratings = read_files.read_working_set(files, WorkingSet(queries), options.columnar)
+        titles = None
+    elif options.load_workers > 0:
+        # Reads both files at the same time in a pool of processes
+        movies, ratings = read_files.read_parallel(files, options.load_workers, options.columnar)
+        titles = None
+    else:
+        movies = read_files.read_f(files[0], True, columnar=options.columnar)  # Reads the movie file to a dict
+        print()
+        ratings = read_files.read_f(files[1], False, movies, options.columnar)  # Reads the ratings file to a dict
+        titles = None
     print("\nTotal movies:", len(movies))
     print("Total ratings:", len(ratings))
 
-    Queries.get_queries(movies, ratings)  # Reads the queries from a file and performs them
+    # Applies just what changed in the tsv files to an out of date snapshot, before anything is built from the movies
+    refreshed = loaded is not None and not current
+    if refreshed:
+        print()
+        refresh.refresh(files, movies, ratings, hashes=hashes)
+        titles = None  # The saved title search is for the movies as they were
+        print("\nTotal movies:", len(movies))
+        print("Total ratings:", len(ratings))
+
+    index = None
+    if options.indexes:
+        print()
+        index = indexes.MovieIndex(movies, ratings, titles)  # Builds the indexes the queries look titles up in
+
+    # Answers the queries NumPy can do with arrays, made after any refresh so they match the movies
+    if options.vectorized and vectorized.np is None:
+        print("\nNumPy isn't installed, so the queries are answered without it", file=sys.stderr)
+    elif options.vectorized:
+        print()
+        Queries.set_engine(vectorized.VectorEngine(movies, ratings))  # Copies the movies and ratings into arrays
+
+    # Reads the queries first for the modes that need all of them at once
+    if queries is None and (options.batch or options.query_workers > 0):
+        queries = sys.stdin.readlines()
+
+    # Adds up the totals STATS and HISTOGRAM are answered from before any worker is forked or client served, or if
+    # the queries are known to ask for them. Otherwise the first of those queries adds them up, if there is one.
+    if options.serve is not None or (queries is not None and asks_for_rollups(queries)):
+        print("\nbuilding rollups...")
+        start = timer()  # Starts timing
+        with instrument.span("rollups.build"):
+            Queries.set_rollups(Rollups(movies.values(), ratings))
+        print("elapsed time (s):", timer() - start)
+
+    # Saves the data for the next run if it had to be read from the tsv files, or to add the title search to it
+    if options.snapshot is not None and (loaded is None or refreshed or (index is not None and titles is None)):
+        print()
+        titles = None if index is None else index.titles
+        snapshot.save_snapshot(options.snapshot, movies, ratings, files, titles)
+
+    if options.bulk_lookup == "-":
+        bulk_lookup.run_bulk(sys.stdin, movies, ratings)  # Looks up the tconsts in batches as they are read
+    elif options.bulk_lookup is not None:
+        with open(options.bulk_lookup, encoding="utf-8") as f:
+            bulk_lookup.run_bulk(f, movies, ratings)
+    elif options.serve is not None:
+        query_server.serve(options.serve, movies, ratings, index)  # Answers queries from clients until stopped
+    elif options.batch:
+        query_batch.run_batch(queries, movies, ratings, index)  # Performs all the queries together
+    elif options.query_workers > 0:
+        # Performs the queries in worker processes forked with the dataset already loaded
+        query_pool.run_pool(queries, movies, ratings, index, options.query_workers)
+    else:
+        Queries.get_queries(movies, ratings, index, queries)  # Reads the queries from a file and performs them
 
 
 if __name__ == '__main__':
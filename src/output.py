@@ -0,0 +1,344 @@
+"""
+Writes the results of the queries. Instead of a print call with a dozen arguments for every row, each row is filled
+into a template made once, the rows of a query are collected in a list and the whole query is written out with a
+single write when it's done. Besides the text format the queries have always printed, the results can be written as
+tab separated values or as JSON Lines for other programs to read.
+
+A sink is told when a query starts, given its results, and told when it ends. With no stream given a sink writes to
+whatever sys.stdout is at the time, so output that is redirected (like in query_pool and query_server) still ends up
+in the right place.
+
+text: exactly what the queries printed before.
+tsv: one line per movie found, with the columns query, year (TOP only), rank (MOST_VOTES and TOP only), tconst,
+    title, type, start year, runtime, genres, rating and votes (LOOKUP, MOST_VOTES and TOP only). There is no header
+    line. A query that finds nothing writes one line with the query and "No match found!", or "Not found!" for
+    LOOKUP, the same as the text format reports.
+jsonl: one JSON object per query with the query, a list of the movies found in the same fields as tsv, and the
+    elapsed time.
+
+STATS and HISTOGRAM write statistics instead of movies: in tsv one line per year (the last line, with no year, is
+for all the years together) with the titles, rated, average rating, votes and average runtime, or one line per range
+with its lowest value, highest value and titles, and in jsonl those fields named the same way.
+
+Any sink can be made without timing, which leaves the elapsed time out of the text and jsonl formats so the output
+of two runs can be compared.
+
+Author: Luke Chelius
+"""
+from abc import ABC, abstractmethod
+import json
+import sys  # stdout
+
+# Templates for the text format, the same text the print calls made
+MOVIE = "Identifier: %s, Title: %s, Type: %s, Year: %s, Runtime: %s, Genres: %s"
+MOVIE_ROW = "\t" + MOVIE + "\n"
+LOOKUP_ROWS = "\tMOVIE: " + MOVIE + "\n\tRATING: Identifier: %s, Rating: %s, Votes: %s\n"
+VOTES_ROW = "\t%d. VOTES: %s, MOVIE: " + MOVIE + "\n"
+TOP_ROW = "\t\t%d. RATING: %s, VOTES: %s, MOVIE: " + MOVIE + "\n"
+STATS_ROW = "\t%s, TITLES: %d, RATED: %d, AVERAGE RATING: %s, VOTES: %d, AVERAGE RUNTIME: %s\n"
+HISTOGRAM_ROW = "\t%s - %s: %d\n"
+NO_MATCH = "No match found!"  # What tsv writes for a query that finds nothing
+NOT_FOUND = "Not found!"  # What tsv writes for a LOOKUP that finds nothing
+
+
+def _fields(movie) -> tuple:
+    """
+    Gets the fields of a movie the text format shows.
+    :param movie: The Movie object
+    :return: A tuple of the tconst, title, type, start year, runtime and genres (separated by ", ")
+    """
+    return (movie.movie_id, movie.primary_title, movie.title_type, movie.start_year, movie.run_time_mins,
+            movie.genres.replace(",", ", "))
+
+
+class Sink(ABC):
+    """
+    Collects what the queries write and writes it to a stream in bulk. Each format fills in how a query starts, how
+    the results of each kind of query are written and how a query ends.
+    """
+
+    def __init__(self, stream=None, timing: bool = True):
+        """
+        Makes a sink.
+        :param stream: The text stream to write to, or None for whatever sys.stdout is when writing
+        :param timing: False to leave the elapsed time of each query out of the output
+        """
+        self.stream = stream
+        self.timing = timing
+        self._parts = []  # Text waiting to be written
+
+    def write(self, text: str) -> None:
+        """
+        Adds some text to be written at the next flush.
+        :param text: The text
+        :return: None
+        """
+        self._parts.append(text)
+
+    def flush(self) -> None:
+        """
+        Writes out everything collected so far in one write.
+        :return: None
+        """
+        if self._parts:
+            (sys.stdout if self.stream is None else self.stream).write("".join(self._parts))
+            self._parts.clear()
+
+    def discard(self) -> None:
+        """
+        Throws away everything collected since the last flush, e.g. the start of a query that failed part way.
+        :return: None
+        """
+        self._parts.clear()
+
+    @abstractmethod
+    def begin(self, *query) -> None:
+        """
+        Starts a query.
+        :param query: The name of the query and its arguments
+        :return: None
+        """
+
+    @abstractmethod
+    def movies(self, results: list) -> None:
+        """
+        Writes the results of CONTAINS, YEAR_AND_GENRE or RUNTIME.
+        :param results: The list of Movie objects
+        :return: None
+        """
+
+    @abstractmethod
+    def lookup(self, tconst: str, found) -> None:
+        """
+        Writes the results of LOOKUP.
+        :param tconst: The tconst looked up
+        :param found: A tuple of the Movie and Rating objects, or None if either isn't found
+        :return: None
+        """
+
+    @abstractmethod
+    def lookups(self, results: list, elapsed: float) -> None:
+        """
+        Writes a whole batch of LOOKUP queries from their fields instead of Movie and Rating objects, each the same as
+        if it was begun, given to lookup and ended without flushing. Used by bulk_lookup.
+        :param results: A list of (tconst, fields) tuples, the fields being the title, type, start year, runtime,
+                        genres, rating and votes, or None if either the movie or rating isn't found
+        :param elapsed: The time each lookup took in seconds
+        :return: None
+        """
+
+    @abstractmethod
+    def most_votes(self, results: list, movies: dict) -> None:
+        """
+        Writes the results of MOST_VOTES.
+        :param results: The list of Rating objects
+        :param movies: The dictionary containing all the titles from the movie dataset
+        :return: None
+        """
+
+    @abstractmethod
+    def top(self, results: list, begin_year: int, movies: dict) -> None:
+        """
+        Writes the results of TOP.
+        :param results: The list with a list of Rating objects for each year
+        :param begin_year: The first year the movies were found for
+        :param movies: The dictionary containing all the titles from the movie dataset
+        :return: None
+        """
+
+    @abstractmethod
+    def stats(self, results: list) -> None:
+        """
+        Writes the results of STATS.
+        :param results: The list of (year, titles, rated, average rating, votes, average runtime) tuples, the last
+                        one for all the years with None for the year
+        :return: None
+        """
+
+    @abstractmethod
+    def histogram(self, results: list) -> None:
+        """
+        Writes the results of HISTOGRAM.
+        :param results: The list of (lowest, highest, titles) tuples
+        :return: None
+        """
+
+    @abstractmethod
+    def end(self, elapsed: float, flush: bool = True) -> None:
+        """
+        Finishes a query and writes out what's left of it.
+        :param elapsed: The time the query took in seconds
+        :param flush: False to keep the query waiting with the ones after it until the next flush
+        :return: None
+        """
+
+
+class TextSink(Sink):
+    """
+    The text format the queries have always printed.
+    """
+
+    def begin(self, *query) -> None:
+        self.write("\nprocessing: " + " ".join(map(str, query)) + "\n")
+
+    def movies(self, results: list) -> None:
+        if len(results) > 0:
+            self.write("".join([MOVIE_ROW % _fields(movie) for movie in results]))
+        else:
+            self.write("\tNo match found!\n")
+
+    def lookup(self, tconst: str, found) -> None:
+        if found is not None:
+            movie, rating = found
+            self.write(LOOKUP_ROWS % ((tconst,) + _fields(movie)[1:] +
+                                      (tconst, rating.average_rating, rating.num_votes)))
+        else:
+            self.write("\tMovie not found!\n\tRating not found!\n")
+
+    def lookups(self, results: list, elapsed: float) -> None:
+        ending = "elapsed time (s): " + str(elapsed) + "\n" if self.timing else ""
+        self.write("".join(["\nprocessing: LOOKUP " + tconst + "\n" +
+                            ("\tMovie not found!\n\tRating not found!\n" if fields is None else
+                             LOOKUP_ROWS % ((tconst,) + fields[:4] + (fields[4].replace(",", ", "), tconst) +
+                                            fields[5:])) + ending
+                            for tconst, fields in results]))
+
+    def most_votes(self, results: list, movies: dict) -> None:
+        if len(results) > 0:
+            self.write("".join([VOTES_ROW % ((i + 1, rating.num_votes) + _fields(movies[rating.movie_id]))
+                                for i, rating in enumerate(results)]))
+        else:
+            self.write("\tNo match found!\n")
+
+    def top(self, results: list, begin_year: int, movies: dict) -> None:
+        for i, result in enumerate(results):
+            self.write("\tYEAR: " + str(begin_year + i) + "\n")
+            if len(result) > 0:
+                self.write("".join([TOP_ROW % ((j + 1, rating.average_rating, rating.num_votes) +
+                                               _fields(movies[rating.movie_id]))
+                                    for j, rating in enumerate(result)]))
+            else:
+                self.write("\t\tNo match found!\n")
+
+    def stats(self, results: list) -> None:
+        if len(results) > 0:
+            self.write("".join([STATS_ROW % (("TOTAL" if row[0] is None else "YEAR: " + str(row[0]),) + row[1:])
+                                for row in results]))
+        else:
+            self.write("\tNo match found!\n")
+
+    def histogram(self, results: list) -> None:
+        if len(results) > 0:
+            self.write("".join([HISTOGRAM_ROW % row for row in results]))
+        else:
+            self.write("\tNo match found!\n")
+
+    def end(self, elapsed: float, flush: bool = True) -> None:
+        if self.timing:
+            self.write("elapsed time (s): " + str(elapsed) + "\n")
+        if flush:
+            self.flush()
+
+
+class _RowSink(Sink):
+    """
+    A sink for the machine readable formats, which turn each movie found into the same row of fields.
+    """
+
+    FIELDS = ("year", "rank", "tconst", "title", "type", "start_year", "runtime", "genres", "rating", "votes")
+    STATS_FIELDS = ("year", "titles", "rated", "average_rating", "votes", "average_runtime")
+    HISTOGRAM_FIELDS = ("low", "high", "titles")
+
+    def __init__(self, stream=None, timing: bool = True):
+        super().__init__(stream, timing)
+        self._query = ""  # The query being performed, as it's written in the query file
+        self._rows = []  # Rows of the movies found by the query, or of the statistics for STATS and HISTOGRAM
+        self._names = self.FIELDS  # Names of the fields in the rows
+        self._status = NO_MATCH  # What to write if the query finds nothing
+
+    def _row(self, movie, rating=None, year=None, rank=None) -> None:
+        """
+        Adds a row for a movie found by the query.
+        :param movie: The Movie object
+        :param rating: Its Rating object if the query found it
+        :param year: The year it was found for in TOP
+        :param rank: Its place in MOST_VOTES or TOP
+        :return: None
+        """
+        self._rows.append((year, rank, movie.movie_id, movie.primary_title, movie.title_type, movie.start_year,
+                           movie.run_time_mins, movie.genres, None if rating is None else rating.average_rating,
+                           None if rating is None else rating.num_votes))
+
+    def begin(self, *query) -> None:
+        self._query = " ".join(map(str, query))
+        self._rows = []
+        self._names = self.FIELDS
+        self._status = NO_MATCH
+
+    def movies(self, results: list) -> None:
+        for movie in results:
+            self._row(movie)
+
+    def lookup(self, tconst: str, found) -> None:
+        self._status = NOT_FOUND
+        if found is not None:
+            self._row(*found)
+
+    def lookups(self, results: list, elapsed: float) -> None:
+        for tconst, fields in results:
+            self.begin("LOOKUP", tconst)
+            self._status = NOT_FOUND
+            if fields is not None:
+                self._rows.append((None, None, tconst) + fields)
+            self.end(elapsed, flush=False)
+
+    def most_votes(self, results: list, movies: dict) -> None:
+        for i, rating in enumerate(results):
+            self._row(movies[rating.movie_id], rating, rank=i + 1)
+
+    def top(self, results: list, begin_year: int, movies: dict) -> None:
+        for i, result in enumerate(results):
+            for j, rating in enumerate(result):
+                self._row(movies[rating.movie_id], rating, begin_year + i, j + 1)
+
+    def stats(self, results: list) -> None:
+        self._names = self.STATS_FIELDS
+        self._rows.extend(results)
+
+    def histogram(self, results: list) -> None:
+        self._names = self.HISTOGRAM_FIELDS
+        self._rows.extend(results)
+
+
+class TsvSink(_RowSink):
+    """
+    One tab separated line per movie found, or a line saying nothing was found.
+    """
+
+    def end(self, elapsed: float, flush: bool = True) -> None:
+        prefix = self._query + "\t"
+        if self._rows:
+            self.write("".join([prefix + "\t".join(["" if field is None else str(field) for field in row]) + "\n"
+                                for row in self._rows]))
+        else:
+            self.write(prefix + self._status + "\n")
+        if flush:
+            self.flush()
+
+
+class JsonLinesSink(_RowSink):
+    """
+    One JSON object per query.
+    """
+
+    def end(self, elapsed: float, flush: bool = True) -> None:
+        results = [{name: field for name, field in zip(self._names, row) if field is not None} for row in self._rows]
+        line = {"query": self._query, "results": results}
+        if self.timing:
+            line["elapsed"] = elapsed
+        self.write(json.dumps(line, ensure_ascii=False) + "\n")
+        if flush:
+            self.flush()
+
+
+SINKS = {"text": TextSink, "tsv": TsvSink, "jsonl": JsonLinesSink}  # Name of each format to its sink
@@ -0,0 +1,120 @@
+"""
+Performs a whole file of queries as one batch instead of one line at a time. Every query other than LOOKUP only
+looks at the titles of one type, so the queries are read first and grouped by type, the titles of each type needed
+are found with one shared pass through the movies, and every query of that type searches just that list. Queries
+that appear more than once are only worked out once. The results are then printed in the order the queries were
+given, in the same format as performing them one by one.
+
+Without indexes each query would otherwise go through every movie in the dataset, so a file with many queries of a
+few types does much less work. With indexes the queries already look up only the titles they need, so the indexes
+are used for them as usual and only repeated queries are saved.
+
+Author: Luke Chelius
+"""
+from movie_store import MovieStore
+import Queries  # parse_query, cached, find_*, print_*, sink
+from timeit import default_timer as timer
+
+
+def partition(movies, types: set) -> dict:
+    """
+    Finds the movies of each of some types, going through a dictionary of movies only once.
+    :param movies: The dictionary (or MovieStore) containing all the titles from the movie dataset
+    :param types: The types of movies to find
+    :return: A dictionary of type to a list of its Movie objects in dictionary order
+    """
+    # A store can find a type from its column of type codes without building every Movie object
+    if isinstance(movies, MovieStore):
+        return {title_type: list(movies.of_type(title_type)) for title_type in types}
+    partitions = {title_type: [] for title_type in types}
+    for movie in movies.values():
+        found = partitions.get(movie.title_type)
+        if found is not None:
+            found.append(movie)
+    return partitions
+
+
+def find(query: tuple, movies: dict, ratings: dict, index=None, candidates=None):
+    """
+    Finds the results of one parsed query without printing them.
+    :param query: The tuple given by Queries.parse_query
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param candidates: The movies of the query's type in dictionary order, or None to find them
+    :return: The results the matching Queries.find_* function gives
+    """
+    if query[0] == "LOOKUP":
+        return Queries.find_lookup(query[1], movies, ratings)
+    elif query[0] == "CONTAINS":
+        return Queries.find_contains(*query[1:], movies, index, candidates)
+    elif query[0] == "YEAR_AND_GENRE":
+        return Queries.find_year_and_genre(*query[1:], movies, index, candidates)
+    elif query[0] == "RUNTIME":
+        return Queries.find_runtime(*query[1:], movies, index, candidates)
+    elif query[0] == "MOST_VOTES":
+        return Queries.find_most_votes(*query[1:], movies, ratings, index, candidates)
+    elif query[0] == "STATS":
+        return Queries.find_stats(*query[1:], movies, ratings)
+    elif query[0] == "HISTOGRAM":
+        return Queries.find_histogram(*query[1:], movies, ratings)
+    return Queries.find_top(*query[1:], movies, ratings, index, candidates)
+
+
+def show(query: tuple, results, movies: dict) -> None:
+    """
+    Writes the results of one parsed query the same way performing it on its own does.
+    :param query: The tuple given by Queries.parse_query
+    :param results: The results given by find
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :return: None
+    """
+    if query[0] == "LOOKUP":
+        Queries.print_lookup(query[1], results)
+    elif query[0] in ("CONTAINS", "YEAR_AND_GENRE", "RUNTIME"):
+        Queries.print_movies(results)
+    elif query[0] == "MOST_VOTES":
+        Queries.print_most_votes(results, movies)
+    elif query[0] == "STATS":
+        Queries.print_stats(results)
+    elif query[0] == "HISTOGRAM":
+        Queries.print_histogram(results)
+    else:
+        Queries.print_top(results, query[3], movies)
+
+
+def run_batch(queries: list, movies: dict, ratings: dict, index=None) -> None:
+    """
+    Performs a batch of queries and prints their results in the order they were given. Since every line is read as a
+    query before any are performed, a line that can't be read stops the batch before anything is printed.
+    :param queries: The lines of the query file
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    print("\nplanning queries...")
+    start = timer()  # Starts timing
+    parsed = [query for query in map(Queries.parse_query, queries) if query is not None]
+    # LOOKUP finds one title, and STATS and HISTOGRAM are answered from the rollups of every title
+    types = {query[1] for query in parsed if query[0] not in ("LOOKUP", "STATS", "HISTOGRAM")}
+    # The indexes already narrow down the movies for each query, otherwise each type is found once for all of them
+    partitions = {} if index is not None else partition(movies, types)
+    elapsed = timer() - start  # Finds the elapsed time
+    print("elapsed time (s):", elapsed)
+
+    # Works out each different query once, grouped by type and kind so queries over the same movies run together
+    found = {}  # Parsed query to a tuple of its results and the time it took to find them
+    for query in sorted(set(parsed), key=lambda query: (query[1], query[0]) if query[0] != "LOOKUP" else ("", "")):
+        start = timer()
+        candidates = partitions.get(query[1]) if query[0] != "LOOKUP" else None
+        results = Queries.cached(query, lambda: find(query, movies, ratings, index, candidates))
+        found[query] = (results, timer() - start)
+
+    for query in parsed:
+        Queries.sink.begin(*query)
+        start = timer()  # Starts timing
+        results, finding = found[query]
+        show(query, results, movies)
+        elapsed = timer() - start + finding  # Adds the time to write the results to the time to find them
+        Queries.sink.end(elapsed)
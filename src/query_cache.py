@@ -0,0 +1,114 @@
+"""
+Keeps the results of recent queries so a query that is asked again doesn't have to search the movies again. The
+results are kept as the lists the find functions in Queries give (not the printed text) under the parsed query, so
+the same query always maps to the same entry however it was spaced in the query file. The least recently used
+results are thrown out once there are too many entries or they hold too many rows in total, and the whole cache has
+to be cleared whenever the movies or ratings change.
+
+Author: Luke Chelius
+"""
+from collections import OrderedDict
+import instrument  # count
+
+MISSING = object()  # Given by get when a query isn't in the cache, since None is a valid result of LOOKUP
+
+
+def result_rows(results) -> int:
+    """
+    Counts the rows in the results of a query, to limit how much the cache holds.
+    :param results: The results given by one of the find functions
+    :return: The number of Movie or Rating objects (1 for LOOKUP)
+    """
+    if results is None or isinstance(results, tuple):
+        return 1
+    return sum(len(result) if isinstance(result, list) else 1 for result in results)
+
+
+class ResultCache:
+    """
+    A least recently used cache of query results with a limit on the entries and the rows they hold.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_rows: int = 1000000):
+        """
+        Makes an empty cache.
+        :param max_entries: The most queries to keep the results of
+        :param max_rows: The most rows to keep across all the results, results with more rows aren't kept at all
+        """
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # Parsed query to a tuple of its results and their rows, oldest first
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clears = 0
+        self._elsewhere = [0, 0]  # Entries and rows held by other caches whose stats were added, see add_stats
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: tuple):
+        """
+        Looks up the results of a query, marking them as just used.
+        :param query: The tuple given by Queries.parse_query
+        :return: The results, or MISSING if they aren't in the cache
+        """
+        entry = self._entries.get(query)
+        if entry is None:
+            self.misses += 1
+            instrument.count("cache.misses")
+            return MISSING
+        self._entries.move_to_end(query)
+        self.hits += 1
+        instrument.count("cache.hits")
+        return entry[0]
+
+    def put(self, query: tuple, results) -> None:
+        """
+        Keeps the results of a query, throwing out the least recently used ones if there's no room.
+        :param query: The tuple given by Queries.parse_query
+        :param results: The results given by one of the find functions
+        :return: None
+        """
+        rows = result_rows(results)
+        if rows > self.max_rows or self.max_entries <= 0:
+            return
+        old = self._entries.pop(query, None)
+        if old is not None:
+            self.rows -= old[1]
+        self._entries[query] = (results, rows)
+        self.rows += rows
+        while len(self._entries) > self.max_entries or self.rows > self.max_rows:
+            self.rows -= self._entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Throws out every result, for when the movies or ratings have changed.
+        :return: None
+        """
+        self._entries.clear()
+        self.rows = 0
+        self.clears += 1
+
+    def stats(self) -> dict:
+        """
+        Gets how well the cache has worked.
+        :return: A dictionary of the hits, misses, evictions, clears, entries and rows
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "clears": self.clears,
+                "entries": len(self._entries) + self._elsewhere[0], "rows": self.rows + self._elsewhere[1]}
+
+    def add_stats(self, stats: dict) -> None:
+        """
+        Adds the stats of another cache to this one's, e.g. the copy of the cache in each of query_pool's workers.
+        :param stats: The dictionary given by the stats method of the other cache
+        :return: None
+        """
+        self.hits += stats["hits"]
+        self.misses += stats["misses"]
+        self.evictions += stats["evictions"]
+        self.clears += stats["clears"]
+        self._elsewhere[0] += stats["entries"]
+        self._elsewhere[1] += stats["rows"]
@@ -0,0 +1,69 @@
+"""
+Sends queries to a server started with movies_main.py --serve and prints the answers. The queries are read from
+standard input one per line, just like movies_main.py reads them, and each one is sent as soon as it's read, so it
+works both with a query file and typed in by hand.
+
+$ python3 src/query_client.py localhost:8140 < input/lookup.txt
+
+Author: Luke Chelius
+"""
+import argparse  # ArgumentParser
+import asyncio
+import sys  # argv, stdin, stdout
+from query_server import parse_address
+
+
+async def _send(writer: asyncio.StreamWriter) -> None:
+    """
+    Sends each line of standard input to the server, then tells it there are no more.
+    :param writer: The stream to the server
+    :return: None
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)  # Reads without holding up the answers
+        if not line:
+            break
+        writer.write(line.encode() if line.endswith("\n") else (line + "\n").encode())
+        await writer.drain()
+    writer.write_eof()
+
+
+async def _receive(reader: asyncio.StreamReader) -> None:
+    """
+    Prints the answers from the server until it closes the connection.
+    :param reader: The stream from the server
+    :return: None
+    """
+    while True:
+        data = await reader.read(1 << 16)
+        if not data:
+            break
+        sys.stdout.buffer.write(data)  # Writes the bytes as they are, a character could be split between reads
+        sys.stdout.flush()
+
+
+async def query(address: str) -> None:
+    """
+    Connects to a server and sends it the queries from standard input.
+    :param address: The host:port or Unix socket path the server listens on
+    :return: None
+    """
+    where = parse_address(address)
+    if len(where) == 2:
+        reader, writer = await asyncio.open_connection(*where)
+    else:
+        reader, writer = await asyncio.open_unix_connection(where[0])
+    await asyncio.gather(_send(writer), _receive(reader))
+    writer.close()
+
+
+def main(args=sys.argv):
+    parser = argparse.ArgumentParser(description="Sends IMDB queries from standard input to a query server.")
+    parser.add_argument("address", help="host:port or Unix socket path of the server")
+    options = parser.parse_args(args[1:])
+    asyncio.run(query(options.address))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Performs the queries in a pool of worker processes. The queries only read the movies and ratings, so they don't
+depend on each other and can run at the same time on different cores. The workers are forked once the dataset is
+loaded, so they share the movies, ratings and indexes with this process copy-on-write instead of having them pickled
+for each query. Each worker writes a query's results into a buffer and sends back the text, which is written out in
+the order the queries were given so the output is the same as performing them one by one. Each worker fills its own
+copy of the result cache, and the stats of every copy are added to this process's cache at the end. The spans and
+counters a worker records while performing a query are sent back with its results and added to this process's totals.
+
+Where processes can't be forked the queries are performed one by one instead.
+
+Author: Luke Chelius
+"""
+import instrument  # merge, span, take
+import multiprocessing
+import os  # getpid
+import Queries  # cache, parse_query, perform, get_queries, sink
+import sys  # stdout, stderr
+from io import StringIO
+from timeit import default_timer as timer
+
+_shared = None  # The (movies, ratings, index) the forked workers use, set just before they are started
+
+
+def _perform(line: str) -> tuple:
+    """
+    Performs one query in a worker with the shared dataset.
+    :param line: The line of the query file
+    :return: A tuple of the written results, the worker's process id, the time it took, the stats of the worker's
+                result cache so far (None if there's no cache) and the spans and counters the query recorded
+    """
+    movies, ratings, index = _shared
+    start = timer()  # Starts timing
+    buffer = StringIO()
+    Queries.sink.stream = buffer  # Only this worker's copy of the sink is changed
+    with instrument.span("parse"):
+        query = Queries.parse_query(line)
+    if query is not None:
+        Queries.perform(query, movies, ratings, index)
+    elapsed = timer() - start
+    stats = None if Queries.cache is None else Queries.cache.stats()
+    return buffer.getvalue(), os.getpid(), elapsed, stats, instrument.take()
+
+
+def run_pool(queries: list, movies: dict, ratings: dict, index=None, workers: int = 2) -> None:
+    """
+    Performs the queries across a pool of worker processes and prints their results in order. How many queries each
+    worker performed and how fast is printed to standard error at the end.
+    :param queries: The lines of the query file
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :param workers: The number of worker processes
+    :return: None
+    """
+    global _shared
+    if "fork" not in multiprocessing.get_all_start_methods():
+        print("forking isn't supported here, performing the queries one by one", file=sys.stderr)
+        Queries.get_queries(movies, ratings, index, queries)
+        return
+
+    _shared = (movies, ratings, index)
+    sys.stdout.flush()  # So nothing waiting to be written is copied into the workers
+    counts = {}  # Worker process id to a list of the number of queries it performed and the time they took
+    cache_stats = {}  # Worker process id to the latest stats of its result cache
+    start = timer()  # Starts timing
+    # Sends the queries out in small groups so there aren't as many messages between the processes
+    chunk_size = max(1, len(queries) // (workers * 8))
+    # Each worker starts with nothing recorded, since what it copied from this process is already in the totals
+    with multiprocessing.get_context("fork").Pool(workers, initializer=instrument.take) as pool:
+        for text, pid, elapsed, stats, recorded in pool.imap(_perform, queries, chunk_size):
+            Queries.sink.write(text)
+            Queries.sink.flush()
+            instrument.merge(recorded)
+            count = counts.setdefault(pid, [0, 0.0])
+            count[0] += 1
+            count[1] += elapsed
+            cache_stats[pid] = stats
+    elapsed = timer() - start  # Finds the elapsed time
+    _shared = None
+    if Queries.cache is not None:
+        for stats in cache_stats.values():
+            Queries.cache.add_stats(stats)
+
+    sys.stdout.flush()
+    for number, (pid, (performed, busy)) in enumerate(sorted(counts.items())):
+        print("worker", str(number + 1) + ":", performed, "queries in", round(busy, 3), "s,",
+              round(performed / busy if busy > 0 else 0.0, 1), "queries/s", file=sys.stderr)
+    print("all workers:", len(queries), "queries in", round(elapsed, 3), "s,",
+          round(len(queries) / elapsed if elapsed > 0 else 0.0, 1), "queries/s", file=sys.stderr)
@@ -0,0 +1,132 @@
+"""
+Keeps the dataset loaded and answers queries sent over a socket, so a few lookups don't have to wait for the dataset
+to be read again each time. It is started with the --serve option of movies_main.py once the dataset (and indexes)
+are loaded, and listens on a TCP address like localhost:8140 or on a Unix socket at a path.
+
+Clients send queries in the same format as the query files, one per line, and get back the text that performing
+them prints, in the order they were sent. The connection can be kept open for more queries, and the server closes
+it once the client has finished sending. Many clients can be connected at once, but the queries are performed one
+at a time, each as a whole before the next one from any client, in a thread of their own so the server keeps
+accepting clients and sending answers while a slow query runs. A line that can't be read as a query (including one
+that isn't UTF-8), or a query that fails, gets an error line back instead of stopping the server.
+
+$ python3 src/movies_main.py small --indexes --serve localhost:8140
+$ python3 src/query_client.py localhost:8140 < input/lookup.txt
+
+Author: Luke Chelius
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os  # remove
+import Queries  # parse_query, perform, sink
+from contextlib import redirect_stdout
+from io import StringIO
+
+LINE_LIMIT = 1 << 16  # Longest query line a client can send
+
+
+def parse_address(address: str) -> tuple:
+    """
+    Reads a server address, either host:port for TCP or the path of a Unix socket.
+    :param address: The address
+    :return: A tuple of the host and port, or a tuple of just the path for a Unix socket
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address,
+
+
+def answer(line: str, movies: dict, ratings: dict, index=None) -> str:
+    """
+    Performs one query and gets what it prints.
+    :param line: The line of the query
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: The printed text, or an error line if the query couldn't be read or failed
+    """
+    buffer = StringIO()
+    try:
+        query = Queries.parse_query(line)
+    except (IndexError, ValueError):
+        return "error: could not read query: " + line.strip() + "\n"
+    if query is not None:
+        with redirect_stdout(buffer):
+            try:
+                Queries.perform(query, movies, ratings, index)
+            except Exception as error:
+                Queries.sink.discard()  # So what the query wrote before failing isn't sent with the next one
+                return "error: could not perform query: " + line.strip() + ": " + repr(error) + "\n"
+    return buffer.getvalue()
+
+
+async def _serve_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, dataset: tuple,
+                        executor: ThreadPoolExecutor) -> None:
+    """
+    Answers the queries from one client until it stops sending them.
+    :param reader: The stream the queries come in on
+    :param writer: The stream the answers go out on
+    :param dataset: A tuple of the movies, ratings and index
+    :param executor: The single thread the queries are performed in
+    :return: None
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                query = line.decode()
+            except UnicodeDecodeError:
+                # Answered like any other line that can't be read as a query, keeping the connection open
+                text = "error: could not read query: " + line.decode(errors="replace").strip() + "\n"
+            else:
+                text = await loop.run_in_executor(executor, answer, query, *dataset)
+            writer.write(text.encode())
+            await writer.drain()  # Waits for a slow client to catch up before answering more of its queries
+    except (ConnectionError, ValueError):
+        pass  # The client went away or sent a line that was too long
+    finally:
+        writer.close()
+
+
+async def _serve(address: str, dataset: tuple) -> None:
+    """
+    Runs the server until it's stopped.
+    :param address: The host:port or Unix socket path to listen on
+    :param dataset: A tuple of the movies, ratings and index
+    :return: None
+    """
+    # One thread performs every query, since they all write through the same sink and standard output
+    with ThreadPoolExecutor(1) as executor:
+        async def serve_client(reader, writer):
+            await _serve_client(reader, writer, dataset, executor)
+
+        where = parse_address(address)
+        if len(where) == 2:
+            server = await asyncio.start_server(serve_client, *where, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_unix_server(serve_client, where[0], limit=LINE_LIMIT)
+        print("\nserving queries on", address, flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def serve(address: str, movies: dict, ratings: dict, index=None) -> None:
+    """
+    Answers queries from clients on an address until interrupted (Ctrl+C).
+    :param address: The host:port or Unix socket path to listen on
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None to search every movie
+    :return: None
+    """
+    try:
+        asyncio.run(_serve(address, (movies, ratings, index)))
+    except KeyboardInterrupt:
+        print("server stopped")
+    finally:
+        if len(parse_address(address)) == 1 and os.path.exists(address):
+            os.remove(address)  # Cleans up the Unix socket file
@@ -0,0 +1,180 @@
+"""
+Rankings of the rated movies worked out once so MOST_VOTES and TOP don't have to search every movie and keep
+re-sorting a list of the best ones found so far. For every type there is a list of its rated movies ordered by most
+votes then title, and for every type and start year a list of the movies with at least 1000 votes ordered by highest
+rating, most votes, then title. A query then only has to take the first movies off a list.
+
+The bounded search the queries used before only lets a movie replace the last one kept if it is strictly better, so
+when movies that tie on the compared values straddle the cut off, which of them are kept depends on the order they
+were found in. In that case just the tied movies and the ones ahead of them are searched the old way, in dictionary
+order, so the results are the same as before.
+
+Author: Luke Chelius
+"""
+from array import array
+from bisect import insort
+from movie_store import movie_rows
+
+MIN_TOP_VOTES = 1000  # The number of votes a movie needs to be included in TOP
+
+
+class Rankings:
+    """
+    Rated movies ordered by votes for each type, and by rating for each type and start year.
+    """
+
+    def __init__(self, movies, ratings, rows=None):
+        """
+        Ranks the rated movies.
+        :param movies: The dictionary (or MovieStore) containing all the titles from the movie dataset
+        :param ratings: The dictionary (or RatingStore) containing all the ratings from the rating dataset
+        :param rows: The (values, position to Movie function) tuple given by movie_rows if it was already found
+        """
+        values, self._movie = movie_rows(movies) if rows is None else rows
+        self._ratings = ratings
+        by_votes = {}  # Type to a list of (-votes, title, position)
+        by_rating = {}  # (type, start year) to a list of (-rating, -votes, title, position)
+        for position, movie in enumerate(values):
+            rating = ratings.get(movie.movie_id)
+            if rating is None:
+                continue
+            by_votes.setdefault(movie.title_type, []).append((-rating.num_votes, movie.primary_title, position))
+            if rating.num_votes >= MIN_TOP_VOTES:
+                by_rating.setdefault((movie.title_type, movie.start_year), []).append(
+                    (-rating.average_rating, -rating.num_votes, movie.primary_title, position))
+
+        # Only the positions are kept once the lists are sorted, the rest can be looked up again
+        self.by_votes = {}  # Type to the positions of its rated movies by most votes then title
+        for title_type, entries in by_votes.items():
+            entries.sort()
+            self.by_votes[title_type] = array("I", (entry[-1] for entry in entries))
+        self.by_rating = {}  # (type, start year) to the positions by highest rating, most votes, then title
+        for key, entries in by_rating.items():
+            entries.sort()
+            self.by_rating[key] = array("I", (entry[-1] for entry in entries))
+
+    def _pair(self, position: int) -> tuple:
+        """
+        Gets the movie at a position and its rating.
+        :param position: The position of the movie
+        :return: A tuple of the Movie and Rating objects
+        """
+        movie = self._movie(position)
+        return movie, self._ratings[movie.movie_id]
+
+    def _best(self, ranked: array, num: int, compared, sort_key) -> list:
+        """
+        Takes the first num movies off a ranked list, the way the old bounded search would have picked them.
+        :param ranked: The positions of the movies, best first
+        :param num: The number of movies to take
+        :param compared: Function from a Rating to the values a movie has to beat the last one kept on
+        :param sort_key: Function from a (Movie, Rating) tuple to the order the kept movies are listed in
+        :return: A list of the Rating objects in order
+        """
+        if len(ranked) <= num:
+            return [self._pair(position)[1] for position in ranked]
+        pairs = [self._pair(position) for position in ranked[:num]]
+        cut_off = compared(pairs[-1][1])
+        end = num
+        while end < len(ranked) and compared(self._pair(ranked[end])[1]) == cut_off:
+            end += 1
+        if end == num:
+            return [pair[1] for pair in pairs]
+
+        # Movies tied at the cut off: goes through them and the better movies in dictionary order, only letting a
+        # movie replace the last one kept if it is strictly better, just like the search through the dictionary did
+        kept = []  # Sorted list of (sort key, order found, Rating)
+        for found, position in enumerate(sorted(ranked[:end])):
+            pair = self._pair(position)
+            if len(kept) < num:
+                insort(kept, (sort_key(pair), found, pair[1]))
+            elif compared(pair[1]) > compared(kept[-1][2]):
+                kept.pop()
+                insort(kept, (sort_key(pair), found, pair[1]))
+        return [entry[2] for entry in kept]
+
+    def most_votes(self, movie_type: str, num: int) -> list:
+        """
+        Finds the rated movies of a type with the most votes.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param num: The number of movies to find, at least 1
+        :return: A list of the Rating objects ordered by most votes then title
+        """
+        return self._best(self.by_votes.get(movie_type, ()), num, lambda rating: rating.num_votes,
+                          lambda pair: (-pair[1].num_votes, pair[0].primary_title))
+
+    def top(self, movie_type: str, num: int, year: int) -> list:
+        """
+        Finds the highest rated movies of a type that started in a year and have at least 1000 votes.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param num: The number of movies to find, at least 1
+        :param year: The start year of the movies
+        :return: A list of the Rating objects ordered by highest rating, most votes, then title
+        """
+        return self._best(self.by_rating.get((movie_type, year), ()), num,
+                          lambda rating: (rating.average_rating, rating.num_votes),
+                          lambda pair: (-pair[1].average_rating, -pair[1].num_votes, pair[0].primary_title))
+
+    def discard(self, position: int, movie, rating) -> None:
+        """
+        Takes a rated movie off the rankings, e.g. before it changes or is deleted.
+        :param position: The position of the movie
+        :param movie: The Movie object as it was ranked
+        :param rating: Its Rating object as it was ranked
+        :return: None
+        """
+        self.by_votes[movie.title_type].remove(position)
+        if rating.num_votes >= MIN_TOP_VOTES:
+            self.by_rating[(movie.title_type, movie.start_year)].remove(position)
+
+    def add(self, position: int, movie, rating) -> None:
+        """
+        Puts a rated movie into its place in the rankings. The movie and rating have to be the ones the position and
+        tconst now give.
+        :param position: The position of the movie
+        :param movie: The Movie object
+        :param rating: Its Rating object
+        :return: None
+        """
+        _insert(self.by_votes.setdefault(movie.title_type, array("I")), position,
+                lambda other: _votes_key(self._pair(other)) + (other,))
+        if rating.num_votes >= MIN_TOP_VOTES:
+            _insert(self.by_rating.setdefault((movie.title_type, movie.start_year), array("I")), position,
+                    lambda other: _rating_key(self._pair(other)) + (other,))
+
+
+def _votes_key(pair: tuple) -> tuple:
+    """
+    Gets the order of a movie in the rankings by votes.
+    :param pair: A tuple of the Movie and Rating objects
+    :return: A tuple of the negative votes and title
+    """
+    return -pair[1].num_votes, pair[0].primary_title
+
+
+def _rating_key(pair: tuple) -> tuple:
+    """
+    Gets the order of a movie in the rankings by rating.
+    :param pair: A tuple of the Movie and Rating objects
+    :return: A tuple of the negative rating, negative votes and title
+    """
+    return -pair[1].average_rating, -pair[1].num_votes, pair[0].primary_title
+
+
+def _insert(ranked: array, position: int, key) -> None:
+    """
+    Inserts a position into a ranked list with a binary search.
+    :param ranked: The positions, ordered by key
+    :param position: The position to insert
+    :param key: Function from a position to the value the list is ordered by
+    :return: None
+    """
+    target = key(position)
+    low, high = 0, len(ranked)
+    while low < high:
+        middle = (low + high) // 2
+        if key(ranked[middle]) < target:
+            low = middle + 1
+        else:
+            high = middle
+    ranked.insert(low, position)
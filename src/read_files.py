@@ -1,16 +1,54 @@
 """
 This reads from given files, it can be used for both the basics and the ratings files based on parameters
 given in the read_f function. It also ignores any adult movies and ratings that have no movie to go along
-with them.
+with them. read_parallel reads both files at once with a pool of processes, and read_working_set streams them
+keeping only the titles a batch of queries needs. Any of the files can also be compressed (.gz, .bz2 or .zst), in
+which case it is decompressed in a separate thread while it is read.
 
 Author: Luke Chelius
 """
+import compressed  # is_compressed, open_text
+from concurrent.futures import ProcessPoolExecutor
+import instrument  # add_span, count
 from Movies import Movie
+from movie_store import MovieStore, RatingStore
 from Ratings import Rating
+from itertools import islice
 from timeit import default_timer as timer
+import io
+import os
+import zlib
 
+BLOCK_LINES = 1 << 14  # Lines parsed at a time before they are filtered, so the two can be timed apart
 
-def read_f(file: str, is_movies: bool, movies={}) -> dict:
+
+def parse_line(line: str, is_movies: bool):
+    """
+    Splits one line of a dataset file into the fields of a Movie or Rating.
+    :param line: The line from the tsv file
+    :param is_movies: A boolean value, True if the line is from the basics dataset, False for the ratings dataset
+    :return: A tuple of the fields in the order the Movie or Rating takes them, or None if it's an adult movie
+    """
+    line = line.strip()  # Gets rid of whitespace at the end of each line
+    title = line.split("\t")  # Separates the line from the tsv file which are separated by tabs
+
+    # Checks if the movie is an adult movie and skips it if it is
+    if is_movies and int(title[4]) == 1:
+        return None
+
+    # Replaces the "\\N" values with 0 or None depending on which field it's in
+    for i in range(len(title)):
+        if title[i] == "\\N" and (i == 5 or i == 6 or i == 7):
+            title[i] = "0"
+        elif title[i] == "\\N" and i == 8:
+            title[i] = "None"
+
+    if is_movies:
+        return title[0], title[1], title[2], title[3], int(title[5]), int(title[6]), int(title[7]), title[8]
+    return title[0], float(title[1]), int(title[2])
+
+
+def read_f(file: str, is_movies: bool, movies={}, columnar=False) -> dict:
     """
     Reads from a dataset file and puts the data into a dictionary where the tconst values are the key and either
     Movie or Rating objects are the values based on what dataset is being read.
@@ -18,38 +56,261 @@ def read_f(file: str, is_movies: bool, movies={}) -> dict:
     :param is_movies: A boolean value, True if the dataset is to be made into Movie objects, False for Rating objects
     :param movies: The movies dictionary, necessary when reading the ratings dataset to ensure no ratings without
                     a corresponding movie are put in the dictionary
+    :param columnar: True to put the data into a MovieStore or RatingStore instead of a dictionary
     :return: A dictionary relating the tconst as the keys to either Movie or Rating objects as the values
     """
-    print("reading", file, "into dict...")
+    print("reading", file, "into", "store..." if columnar else "dict...")
     start = timer()  # Starts timing
     imdb = {}  # Dictionary to store the Movie or Rating objects
-    with open(file, encoding='utf-8') as imdb_f:
+    if columnar:
+        imdb = MovieStore() if is_movies else RatingStore()
+    parsing = filtering = 0.0  # Time spent reading and splitting lines, and deciding which to keep and storing them
+    with compressed.open_text(file) as imdb_f:
         imdb_f.readline()
-        for line in imdb_f:
-            line = line.strip()  # Gets rid of whitespace at the end of each line
-            title = line.split("\t")  # Separates the line from the tsv file which are separated by tabs
+        lines = 0
+        mark = timer()
+        for block in iter(lambda: list(islice(imdb_f, BLOCK_LINES)), []):
+            parsed = [parse_line(line, is_movies) for line in block]
+            lines += len(parsed)
+            middle = timer()
+            parsing += middle - mark
 
-            # Checks if the movie is an adult movie and skips it if it is
-            if is_movies and int(title[4]) == 1:
-                continue
+            for fields in parsed:
+                # Skips adult movies
+                if fields is None:
+                    continue
 
-            # Replaces the "\\N" values with 0 or None depending on which field it's in
-            for i in range(len(title)):
-                if title[i] == "\\N" and (i == 5 or i == 6 or i == 7):
-                    title[i] = "0"
-                elif title[i] == "\\N" and i == 8:
-                    title[i] = "None"
+                # If it's a movie it adds a Movie object with the info to the dictionary
+                if is_movies:
+                    if columnar:
+                        imdb.add(*fields)
+                    else:
+                        imdb[fields[0]] = Movie(*fields)
 
-            # If it's a movie it adds a Movie object with the info to the dictionary
-            if is_movies:
-                imdb[title[0]] = Movie(title[0], title[1], title[2], title[3], int(title[5]), int(title[6]),
-                                       int(title[7]), title[8])
+                # Otherwise it's a rating and it adds a Rating object with the info to the dictionary
+                else:
+                    if fields[0] in movies:
+                        if columnar:
+                            imdb.add(*fields)
+                        else:
+                            imdb[fields[0]] = Rating(*fields)
+            mark = timer()
+            filtering += mark - middle
+    if columnar:
+        imdb.freeze()
 
-            # Otherwise it's a rating and it adds a Rating object with the info to the dictionary
+    elapsed = timer() - start  # Finds the elapsed time
+    name = "read.basics" if is_movies else "read.ratings"
+    instrument.add_span(name, elapsed)
+    instrument.add_span(name + ".parse", parsing)
+    instrument.add_span(name + ".filter", filtering)
+    instrument.count(name + ".lines", lines)
+    instrument.count(name + ".skipped", lines - len(imdb))  # Adult movies, or ratings without a movie
+    print("elapsed time (s):", elapsed)
+    return imdb
+
+
+def _chunks(file: str, parts: int) -> list:
+    """
+    Splits a dataset file, after its header line, into byte ranges that each start at the beginning of a line.
+    :param file: The name of the dataset file
+    :param parts: The number of ranges to split it into, fewer if the file is small
+    :return: A list of (start, end) byte offsets, or just (None, None) for a compressed file, which can only be read
+                from the beginning
+    """
+    if compressed.is_compressed(file):
+        return [(None, None)]
+    size = os.path.getsize(file)
+    bounds = []
+    with open(file, "rb") as imdb_f:
+        imdb_f.readline()
+        bounds.append(imdb_f.tell())
+        for part in range(1, parts):
+            imdb_f.seek(max(bounds[-1], size * part // parts))
+            imdb_f.readline()  # Moves to the start of the next line
+            if imdb_f.tell() >= size:
+                break
+            if imdb_f.tell() > bounds[-1]:
+                bounds.append(imdb_f.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _read_chunk(file: str, start: int, end: int, is_movies: bool) -> list:
+    """
+    Reads the lines in one byte range of a dataset file. Runs in a worker process.
+    :param file: The name of the dataset file
+    :param start: The offset of the first line, or None to read the whole file after its header
+    :param end: The offset just past the last line
+    :param is_movies: A boolean value, True for the basics dataset, False for the ratings dataset
+    :return: A tuple of a list of the fields of each line that isn't an adult movie, in file order, and the number of
+                lines read
+    """
+    if start is None:
+        lines = dataset_lines(file)
+    else:
+        with open(file, "rb") as imdb_f:
+            imdb_f.seek(start)
+            data = imdb_f.read(end - start)
+        # Reads the text the same way as a file opened in text mode would, including how it splits lines
+        lines = io.StringIO(data.decode("utf-8"), newline=None)
+    parsed = [parse_line(line, is_movies) for line in lines]
+    return [fields for fields in parsed if fields is not None], len(parsed)
+
+
+def read_parallel(files: tuple, workers: int, columnar=False) -> tuple:
+    """
+    Reads the basics and ratings files at the same time by splitting each one into chunks and reading them in a pool
+    of processes. The chunks are put back together in file order, so the dictionaries come out in the same order as
+    with read_f, and ratings without a movie are dropped at the end.
+    :param files: The names of the basics and ratings files
+    :param workers: The number of processes to read with
+    :param columnar: True to put the data into a MovieStore and RatingStore instead of dictionaries
+    :return: A tuple of the movies and ratings dictionaries
+    """
+    print("reading", files[0], "and", files[1], "into", "stores" if columnar else "dicts", "with", workers,
+          "processes...")
+    start = timer()  # Starts timing
+    movies = MovieStore() if columnar else {}
+    ratings = RatingStore() if columnar else {}
+    lines = [0, 0]  # Lines read from the basics and ratings files
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Submits every chunk of both files before waiting on any of them so they are read together
+        basics = [pool.submit(_read_chunk, files[0], *chunk, True) for chunk in _chunks(files[0], workers)]
+        rated = [pool.submit(_read_chunk, files[1], *chunk, False) for chunk in _chunks(files[1], workers)]
+        for future in basics:
+            # The parse span is the time spent waiting for the workers to parse a chunk
+            with instrument.span("read.basics.parse"):
+                chunk, read = future.result()
+            lines[0] += read
+            with instrument.span("read.basics.filter"):
+                for fields in chunk:
+                    if columnar:
+                        movies.add(*fields)
+                    else:
+                        movies[fields[0]] = Movie(*fields)
+        for future in rated:
+            with instrument.span("read.ratings.parse"):
+                chunk, read = future.result()
+            lines[1] += read
+            with instrument.span("read.ratings.filter"):
+                for fields in chunk:
+                    # Leaves out ratings that have no movie to go with them
+                    if fields[0] in movies:
+                        if columnar:
+                            ratings.add(*fields)
+                        else:
+                            ratings[fields[0]] = Rating(*fields)
+    if columnar:
+        movies.freeze()
+        ratings.freeze()
+
+    elapsed = timer() - start  # Finds the elapsed time
+    instrument.add_span("read.parallel", elapsed)
+    for name, read, kept in (("read.basics", lines[0], len(movies)), ("read.ratings", lines[1], len(ratings))):
+        instrument.count(name + ".lines", read)
+        instrument.count(name + ".skipped", read - kept)  # Adult movies, or ratings without a movie
+    print("elapsed time (s):", elapsed)
+    return movies, ratings
+
+
+def line_hash(line: str) -> int:
+    """
+    Finds a checksum of a line of a dataset file, so refresh can tell if the line a title was read from has changed
+    without parsing it.
+    :param line: The line, as dataset_lines gives it
+    :return: The CRC-32 of the line
+    """
+    return zlib.crc32(line.encode("utf-8"))
+
+
+def line_hashes(file: str, tconsts) -> dict:
+    """
+    Finds the checksum of the line each of some titles was read from.
+    :param file: The name of the dataset file
+    :param tconsts: The dictionary (or store) of the titles that were kept from the file
+    :return: A dictionary of tconst to the line_hash of its line, the last one if a tconst is there more than once
+    """
+    hashes = {}
+    for line in dataset_lines(file):
+        tconst = line[:line.find("\t")]
+        if tconst in tconsts:
+            hashes[tconst] = line_hash(line)
+    return hashes
+
+
+def dataset_lines(file: str):
+    """
+    Goes through the lines of a dataset file after its header.
+    :param file: The name of the dataset file
+    :return: A generator of the lines
+    """
+    with compressed.open_text(file) as imdb_f:
+        imdb_f.readline()
+        yield from imdb_f
+
+
+def _timed_blocks(kept, name: str):
+    """
+    Gathers the lines a filter keeps into blocks, timing the filtering (reading the file and deciding which lines to
+    keep) and the parsing and storing of each block done by the caller as separate spans.
+    :param kept: An iterator of the lines the filter keeps
+    :param name: The start of the span names, e.g. "read.basics"
+    :return: A generator of lists of lines
+    """
+    mark = timer()
+    for block in iter(lambda: list(islice(kept, BLOCK_LINES)), []):
+        middle = timer()
+        instrument.add_span(name + ".filter", middle - mark)
+        yield block
+        mark = timer()
+        instrument.add_span(name + ".parse", mark - middle)
+    instrument.add_span(name + ".filter", timer() - mark)  # The lines after the last block that was kept
+
+
+def read_working_set(files: tuple, working_set, columnar=False) -> tuple:
+    """
+    Streams the basics and ratings files through a pipeline of generators that only keeps the titles a batch of
+    queries needs (and their ratings), leaving out the original titles and end years, which no query uses. Only the
+    type, start year and tconst of a line are looked at before deciding to keep it.
+    :param files: The names of the basics and ratings files
+    :param working_set: The WorkingSet of the queries
+    :param columnar: True to put the data into a MovieStore and RatingStore instead of dictionaries
+    :return: A tuple of the movies and ratings dictionaries
+    """
+    print("reading", files[0], "and", files[1], "into", "stores" if columnar else "dicts", "for the queries...")
+    start = timer()  # Starts timing
+    movies = MovieStore() if columnar else {}
+    ratings = RatingStore() if columnar else {}
+
+    # Splits off just the fields needed to decide if a line is kept
+    heads = ((line, line.split("\t", 6)) for line in dataset_lines(files[0]))
+    kept = (line for line, head in heads if working_set.keeps(head[0], head[1], head[5]))
+    for block in _timed_blocks(kept, "read.basics"):
+        for fields in (parse_line(line, True) for line in block):
+            if fields is None:
+                continue
+            fields = fields[:3] + ("", fields[4], 0) + fields[6:]  # Drops the original title and end year
+            if columnar:
+                movies.add(*fields)
             else:
-                if title[0] in movies:
-                    imdb[title[0]] = Rating(title[0], float(title[1]), int(title[2]))
+                movies[fields[0]] = Movie(*fields)
+
+    kept = (line for line in dataset_lines(files[1]) if line[:line.find("\t")] in movies)
+    for block in _timed_blocks(kept, "read.ratings"):
+        for fields in (parse_line(line, False) for line in block):
+            if columnar:
+                ratings.add(*fields)
+            else:
+                ratings[fields[0]] = Rating(*fields)
+    if columnar:
+        movies.freeze()
+        ratings.freeze()
 
     elapsed = timer() - start  # Finds the elapsed time
+    instrument.add_span("read.working_set", elapsed)
+    instrument.count("read.basics.kept", len(movies))
+    instrument.count("read.ratings.kept", len(ratings))
     print("elapsed time (s):", elapsed)
-    return imdb
+    return movies, ratings
+
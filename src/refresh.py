@@ -0,0 +1,145 @@
+"""
+Brings the loaded movies and ratings up to date with newer dataset files without reading them into new
+dictionaries. The new files are compared with what is loaded, and only the titles and ratings that were inserted,
+changed or deleted are touched, along with their entries in the MovieIndex and its rankings and title search and
+their totals in the rollups of STATS and HISTOGRAM. Any cached query results are thrown out and the arrays of the
+vectorized engine are made again. The same filters as read_f are applied: adult titles are left out (so a title that
+became adult is deleted) and so are ratings for titles that aren't loaded.
+
+Given the checksum of the line each title and rating was loaded from (which a snapshot keeps), a line of the new
+files with the same checksum keeps the Movie or Rating that is already loaded and isn't parsed at all, so only the
+lines that are new or different are parsed. Without the checksums every line is parsed and compared.
+
+The dictionaries end up the same as reading the new files from scratch, including their order, which decides how
+ties are broken in the queries: they are made again in the order of the files as the files are compared, so a
+rating added for an older title goes where it belongs without another pass through the file. The index keeps its
+positions as long as the titles that were already there come in the same order in the new file and every inserted
+title comes after them, like new tconsts do in the IMDB dumps. If that isn't the case, the index is built again,
+which costs as much as building it after reading the files again.
+
+Author: Luke Chelius
+"""
+from indexes import MovieIndex
+from Movies import Movie
+import Queries  # cache, engine, rollups
+from Ratings import Rating
+from read_files import dataset_lines, line_hash, parse_line
+from timeit import default_timer as timer
+from vectorized import VectorEngine
+import operator
+
+# The fields of a Movie and Rating in the order parse_line gives them
+movie_fields = operator.attrgetter("movie_id", "title_type", "primary_title", "original_title", "start_year",
+                                   "end_year", "run_time_mins", "genres")
+rating_fields = operator.attrgetter("movie_id", "average_rating", "num_votes")
+
+
+def _changes(file: str, is_movies: bool, current: dict, hashes, keeps) -> tuple:
+    """
+    Compares a dataset file with the loaded movies or ratings, making the dictionary the file gives as it goes.
+    :param file: The name of the new basics or ratings file
+    :param is_movies: True for the basics file, False for the ratings file
+    :param current: The loaded dictionary of movies or ratings
+    :param hashes: A dictionary of tconst to the line_hash of the line each loaded one was read from, or None to
+                    parse and compare every line
+    :param keeps: Function from a tconst to whether it should be kept, for the ratings
+    :return: A tuple of the new dictionary in the order of the file (holding the loaded objects for the ones that
+                didn't change), a dictionary of tconst to the new Movie or Rating for the ones inserted or changed
+                (in the order of the file), a list of the tconsts deleted, the number inserted, and whether every
+                inserted one came after all the ones already there and those were in the same order as they are loaded
+    """
+    fields_of = movie_fields if is_movies else rating_fields
+    make = Movie if is_movies else Rating
+    updated = {}
+    changed = {}
+    inserted = 0
+    in_order = True
+    loaded = iter(current)  # The loaded tconsts in dictionary order, up to the last one found in the file
+    for line in dataset_lines(file):
+        tconst = line[:line.find("\t")]
+        if not keeps(tconst):
+            continue  # Ratings without a movie
+        old = current.get(tconst)
+        if old is None or hashes is None or hashes.get(tconst) != line_hash(line):
+            fields = parse_line(line, is_movies)
+            # Skips adult movies
+            if fields is None:
+                continue
+            if old is None:
+                changed[tconst] = updated[tconst] = make(*fields)
+                inserted += 1
+                continue
+            if fields_of(old) != fields:
+                changed[tconst] = old = make(*fields)
+        # Looks for the tconst further along the dictionary, skipping the ones deleted since
+        in_order = in_order and inserted == 0 and tconst in loaded
+        updated[tconst] = old
+    deleted = [tconst for tconst in current if tconst not in updated]
+    return updated, changed, deleted, inserted, in_order
+
+
+def refresh(files: tuple, movies: dict, ratings: dict, index=None, hashes=None):
+    """
+    Applies the changes in newer dataset files to the loaded movies and ratings and their index.
+    :param files: The names of the new basics and ratings files
+    :param movies: The dictionary containing all the titles from the movie dataset
+    :param ratings: The dictionary containing all the ratings from the rating dataset
+    :param index: The MovieIndex for the movies, or None if there isn't one
+    :param hashes: A tuple of dictionaries of tconst to the line_hash of the line each movie and rating was read
+                    from, as given by snapshot.load_snapshot, or None to parse and compare every line
+    :return: The MovieIndex to use from now on (the same one unless it had to be built again), or None
+    """
+    if not isinstance(movies, dict) or not isinstance(ratings, dict):
+        raise TypeError("only dictionaries of movies and ratings can be refreshed")
+    print("refreshing from", files[0], "and", files[1] + "...")
+    start = timer()  # Starts timing
+
+    movie_hashes, rating_hashes = (None, None) if hashes is None else hashes
+    new_movies, changed_movies, deleted_movies, inserted_movies, in_order = _changes(
+        files[0], True, movies, movie_hashes, lambda tconst: True)
+    new_ratings, changed_ratings, deleted_ratings, inserted_ratings, _ = _changes(
+        files[1], False, ratings, rating_hashes, new_movies.__contains__)
+
+    # Takes every title that is about to change out of the index and rollups while it still matches what was added
+    touched = set(changed_movies).union(deleted_movies, changed_ratings, deleted_ratings)
+    for tconst in touched:
+        if tconst in movies and index is not None and in_order:
+            index.discard(movies[tconst], ratings.get(tconst))
+        if tconst in movies and Queries.rollups is not None:
+            Queries.rollups.discard(movies[tconst], ratings.get(tconst))
+
+    # The same dictionaries are kept, since the index and rankings refer to them
+    movies.clear()
+    movies.update(new_movies)
+    ratings.clear()
+    ratings.update(new_ratings)
+    if Queries.cache is not None:
+        Queries.cache.clear()  # Cached results could be out of date now
+
+    if not in_order:
+        if index is not None:
+            index = MovieIndex(movies, ratings)  # Builds the index again from scratch in the new order
+    elif index is not None:
+        for tconst in deleted_movies:
+            index.forget(tconst)
+        # Adds the inserted movies in the order of the file so they get the same positions as in the dictionary
+        for tconst in changed_movies:
+            index.add(movies[tconst], ratings.get(tconst))
+        for tconst in touched.difference(changed_movies, deleted_movies):
+            index.add(movies[tconst], ratings.get(tconst))
+
+    # The totals don't depend on the order of the movies, so they are added back either way
+    if Queries.rollups is not None:
+        for tconst in touched:
+            if tconst in movies:
+                Queries.rollups.add(movies[tconst], ratings.get(tconst))
+    if Queries.engine is not None:
+        Queries.set_engine(VectorEngine(movies, ratings))  # The arrays are copies, so they are made again
+
+    print("\tmovies:", inserted_movies, "inserted,", len(changed_movies) - inserted_movies, "changed,",
+          len(deleted_movies), "deleted")
+    print("\tratings:", inserted_ratings, "inserted,", len(changed_ratings) - inserted_ratings, "changed,",
+          len(deleted_ratings), "deleted")
+    elapsed = timer() - start  # Finds the elapsed time
+    print("elapsed time (s):", elapsed)
+    return index
@@ -0,0 +1,207 @@
+"""
+Totals of the movies and their ratings worked out once so the aggregate queries don't have to go through every
+movie. The cube has a cell for every type, start year and genre that has titles, holding how many titles there are,
+how many of them are rated, the sum of their ratings and votes, and how many have a runtime and the sum of those
+runtimes. A movie is counted once in the cell of each of its genres and once more under ALL_GENRES, so the totals
+for every genre together don't count a movie twice. Alongside the cube, each type has the number of its titles at
+every rating, runtime, number of votes (to a power of two) and start year, which is what the histograms are made of.
+
+STATS type genre first_year last_year: for each start year, and all of them together, the number of titles, how
+    many are rated, their average rating, total votes and average runtime. The genre has to match one of a title's
+    genres exactly, or be ALL for every title.
+HISTOGRAM type field buckets: the number of titles of a type in equal ranges of rating, votes, runtime or year
+    between the smallest and largest value any of them has (titles without a rating, runtime or year are left out).
+    The ranges of votes are equal in powers of two, since a few titles have far more votes than the rest.
+
+Both only look up as many cells as there are years or values, however many movies there are. The cube is kept up to
+date with add and discard when the movies or ratings are refreshed.
+
+Author: Luke Chelius
+"""
+from collections import Counter
+import operator
+
+ALL_GENRES = "ALL"  # The genre every title is counted under
+FIELDS = ("rating", "votes", "runtime", "year")  # The fields HISTOGRAM can count titles by
+# Indexes of the totals in a cell
+TITLES, RATED, TENTHS, VOTES, TIMED, MINUTES = range(6)
+EMPTY = (0,) * 6  # The totals of a cell with no titles
+
+
+class Rollups:
+    """
+    The cube of totals by type, start year and genre, and the counts of titles by value for each type.
+    """
+
+    def __init__(self, movies, ratings):
+        """
+        Adds up the totals for some movies.
+        :param movies: An iterable of the Movie objects, e.g. the values of the dictionary of movies
+        :param ratings: The dictionary (or RatingStore) containing all the ratings from the rating dataset
+        """
+        self.cells = {}  # (type, start year, genre) to a list of the totals, indexed by TITLES, RATED, etc.
+        self.counts = {}  # Type to a dictionary of field to a Counter of value to titles
+        # Adds up the movies with the same type, start year and genres first, since there are far fewer of those
+        groups = {}  # (type, start year, genres) to a list of the totals
+        timed = []  # (type, runtime) of every movie with a runtime
+        rated = []  # (type, rating in tenths, bit length of the votes) of every rated movie
+        for movie in movies:
+            key = (movie.title_type, movie.start_year, movie.genres)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0] * len(EMPTY)
+            group[TITLES] += 1
+            if movie.run_time_mins > 0:
+                group[TIMED] += 1
+                group[MINUTES] += movie.run_time_mins
+                timed.append((movie.title_type, movie.run_time_mins))
+            rating = ratings.get(movie.movie_id)
+            if rating is not None:
+                tenths = round(rating.average_rating * 10)
+                group[RATED] += 1
+                group[TENTHS] += tenths
+                group[VOTES] += rating.num_votes
+                rated.append((movie.title_type, tenths, rating.num_votes.bit_length()))
+
+        # Then adds each group to the cells of its genres and to its year's count
+        for (title_type, year, genres), group in groups.items():
+            for genre in genres.split(",") + [ALL_GENRES]:
+                cell = self.cells.get((title_type, year, genre))
+                if cell is None:
+                    self.cells[(title_type, year, genre)] = group[:]
+                else:
+                    cell[:] = map(operator.add, cell, group)
+            if year:
+                self._counts(title_type)["year"][year] += group[TITLES]
+        fields = (("runtime", timed), ("rating", ((title_type, tenths) for title_type, tenths, _ in rated)),
+                  ("votes", ((title_type, bits) for title_type, _, bits in rated)))
+        for field, pairs in fields:
+            for (title_type, value), titles in Counter(pairs).items():
+                self._counts(title_type)[field][value] = titles
+
+    def _counts(self, title_type: str) -> dict:
+        """
+        Gets the counts of the titles of a type by value, adding empty ones if the type has none yet.
+        :param title_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :return: A dictionary of field to a Counter of value to titles
+        """
+        counts = self.counts.get(title_type)
+        if counts is None:
+            counts = self.counts[title_type] = {field: Counter() for field in FIELDS}
+        return counts
+
+    def _apply(self, movie, rating, sign: int) -> None:
+        """
+        Adds a movie to the totals or takes it away from them.
+        :param movie: The Movie object
+        :param rating: Its Rating object, or None if it isn't rated
+        :param sign: 1 to add the movie, -1 to take it away
+        :return: None
+        """
+        tenths = 0 if rating is None else round(rating.average_rating * 10)  # Ratings have one decimal place
+        totals = (1, rating is not None, tenths, 0 if rating is None else rating.num_votes, movie.run_time_mins > 0,
+                  movie.run_time_mins)
+        for genre in movie.genres.split(",") + [ALL_GENRES]:
+            key = (movie.title_type, movie.start_year, genre)
+            cell = self.cells.setdefault(key, [0] * len(totals))
+            for i, total in enumerate(totals):
+                cell[i] += sign * total
+            if cell[TITLES] == 0:
+                del self.cells[key]
+
+        counts = self._counts(movie.title_type)
+        values = {"runtime": movie.run_time_mins or None, "year": movie.start_year or None}
+        if rating is not None:
+            values["rating"] = tenths
+            values["votes"] = rating.num_votes.bit_length()  # Which power of two the votes are under
+        for field, value in values.items():
+            if value is not None:
+                counts[field][value] += sign
+                if counts[field][value] == 0:
+                    del counts[field][value]
+
+    def add(self, movie, rating=None) -> None:
+        """
+        Adds a movie to the totals, e.g. after it is inserted or changed.
+        :param movie: The Movie object
+        :param rating: Its Rating object, or None if it isn't rated
+        :return: None
+        """
+        self._apply(movie, rating, 1)
+
+    def discard(self, movie, rating=None) -> None:
+        """
+        Takes a movie away from the totals, e.g. before it is changed or deleted.
+        :param movie: The Movie object as it was added
+        :param rating: Its Rating object as it was added, or None if it wasn't rated
+        :return: None
+        """
+        self._apply(movie, rating, -1)
+
+    def stats(self, movie_type: str, genre: str, begin_year: int, stop_year: int) -> list:
+        """
+        Finds the statistics of the titles of a type and genre for each year in a range and for all of them.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param genre: The genre, or ALL_GENRES for every title
+        :param begin_year: The first start year (inclusive)
+        :param stop_year: The last start year (inclusive)
+        :return: A list of (year, titles, rated, average rating, votes, average runtime) tuples for each year, then
+                    one for all of them with None for the year, or an empty list if there are no years
+        """
+        results = []
+        all_years = EMPTY
+        for year in range(begin_year, stop_year + 1):
+            cell = self.cells.get((movie_type, year, genre), EMPTY)
+            results.append(_summary(year, cell))
+            all_years = [total + value for total, value in zip(all_years, cell)]
+        if results:
+            results.append(_summary(None, all_years))
+        return results
+
+    def histogram(self, movie_type: str, field: str, buckets: int) -> list:
+        """
+        Counts the titles of a type in equal ranges of a field.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param field: One of FIELDS
+        :param buckets: The number of ranges, fewer if there aren't that many different values
+        :return: A list of (lowest, highest, titles) tuples for each range, lowest first, or an empty list if no title
+                    has the field
+        """
+        counts = self.counts.get(movie_type, {}).get(field)
+        if not counts or buckets < 1:
+            return []
+        low, high = min(counts), max(counts)
+        width = -(-(high - low + 1) // buckets)  # Rounds up so there are at most the number of buckets asked for
+        totals = [0] * (-(-(high - low + 1) // width))
+        for value, titles in counts.items():
+            totals[(value - low) // width] += titles
+        return [_labels(field, low + i * width, min(high, low + (i + 1) * width - 1)) + (titles,)
+                for i, titles in enumerate(totals)]
+
+
+def _summary(year, cell) -> tuple:
+    """
+    Works out the statistics of a cell of the cube.
+    :param year: The start year of the cell, or None for several years together
+    :param cell: The totals
+    :return: A tuple of the year, titles, rated, average rating, votes and average runtime, with None for an average
+                of no titles
+    """
+    rating = round(cell[TENTHS] / cell[RATED] / 10, 2) if cell[RATED] > 0 else None
+    runtime = round(cell[MINUTES] / cell[TIMED], 1) if cell[TIMED] > 0 else None
+    return year, cell[TITLES], cell[RATED], rating, cell[VOTES], runtime
+
+
+def _labels(field: str, low: int, high: int) -> tuple:
+    """
+    Turns the range of values a bucket is counted by back into the field's own values.
+    :param field: One of FIELDS
+    :param low: The lowest value counted in the bucket
+    :param high: The highest value counted in the bucket
+    :return: A tuple of the lowest and highest rating, votes, runtime or year in the bucket
+    """
+    if field == "rating":
+        return low / 10, high / 10
+    if field == "votes":
+        return (2 ** low) // 2, 2 ** high - 1  # Votes with a bit length of n are from 2 ** (n - 1) to 2 ** n - 1
+    return low, high
@@ -0,0 +1,290 @@
+"""
+Saves the movies and ratings dictionaries to a binary snapshot file and loads them back without parsing the tsv
+files again. The snapshot stores every field as its own column (typed arrays for the numbers and newline separated
+string pools for the text) laid out exactly like the arrays of a MovieStore and RatingStore. It is opened with mmap
+and can be used as a pair of stores directly over the mapped pages, so several processes reading the same snapshot
+share them.
+The trigram index used by CONTAINS can be saved along with them. A snapshot remembers the size, modification time and
+hash of the files it was made from and is ignored once any of them change, along with a checksum of the line each
+title and rating was read from so refresh only has to parse the lines of newer files that are different.
+
+Author: Luke Chelius
+"""
+from array import array, typecodes
+import instrument  # add_span, count, span
+from movie_store import MovieStore, RatingStore, to_stores
+from read_files import line_hashes
+from title_search import TitleSearch
+from timeit import default_timer as timer
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b"IMDBSNAP"  # Marks the start of every snapshot file
+VERSION = 3  # Changes whenever the layout of the columns changes
+ALIGNMENT = 8  # Every column starts on a multiple of this so it can be cast to a typed memoryview
+HASH_CHUNK = 1 << 20  # Number of bytes hashed at a time when fingerprinting a source file
+# The columns every snapshot has, and the ones it has as well if the title search was saved with it
+STORE_COLUMNS = (*MovieStore().columns(), *RatingStore().columns(), "movie_line_hashes", "rating_line_hashes")
+TITLE_COLUMNS = ("trigram_keys", "trigram_key_offsets", "trigram_offsets", "trigram_postings")
+
+
+def fingerprint(file: str) -> dict:
+    """
+    Finds the size, modification time and sha256 hash of a file so a snapshot can tell if it has changed.
+    :param file: The name of the dataset file
+    :return: A dictionary with the path, size, mtime_ns and sha256 of the file
+    """
+    stat = os.stat(file)
+    digest = hashlib.sha256()
+    with open(file, "rb") as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return {"path": os.path.abspath(file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest.hexdigest()}
+
+
+def save_snapshot(path: str, movies: dict, ratings: dict, files: tuple, titles=None) -> None:
+    """
+    Writes the movies and ratings to a snapshot file. The file is written next to its final name first and moved
+    into place at the end so a reader never sees half a snapshot.
+    :param path: The name of the snapshot file to write
+    :param movies: The dictionary (or MovieStore) with the tconst values as the key for each Movie object
+    :param ratings: A dictionary (or RatingStore) with the tconst values as the key for each Rating object
+    :param files: The names of the basics and ratings files the dictionaries were read from
+    :param titles: The TitleSearch for the movies to save with them, or None
+    :return: None
+    """
+    print("writing snapshot", path + "...")
+    start = timer()  # Starts timing
+    movies, ratings = to_stores(movies, ratings)
+    columns = {**movies.columns(), **ratings.columns()}  # Column name to the array or bytes holding it
+    # The checksum of the line each title and rating was read from, in the same order as the stores
+    for name, file, store in (("movie_line_hashes", files[0], movies), ("rating_line_hashes", files[1], ratings)):
+        hashes = line_hashes(file, store)
+        columns[name] = array("I", [hashes.get(tconst, 0) for tconst in store])
+    if titles is not None:
+        columns.update(titles.columns())
+
+    # Lays the columns out one after another, each starting on an aligned offset from the start of the data
+    layout = {}
+    position = 0
+    for name, column in columns.items():
+        with memoryview(column) as view:
+            layout[name] = {"offset": position, "length": view.nbytes, "typecode": view.format}
+        position += -(-layout[name]["length"] // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({"sources": [fingerprint(file) for file in files], "movies": len(movies),
+                         "ratings": len(ratings), "tables": movies.tables(), "columns": layout}).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    temp = path + ".tmp"
+    with open(temp, "wb") as out:
+        out.write(MAGIC + struct.pack("<II", VERSION, len(header)) + header)
+        for name, column in columns.items():
+            out.seek(data_start + layout[name]["offset"])
+            out.write(column)
+        out.truncate(data_start + position)
+    os.replace(temp, path)
+
+    elapsed = timer() - start  # Finds the elapsed time
+    instrument.add_span("snapshot.save", elapsed)
+    instrument.count("snapshot.save.bytes", data_start + position)
+    print("elapsed time (s):", elapsed)
+
+
+class Snapshot:
+    """
+    A memory mapped snapshot file. Numeric columns are handed out as typed memoryviews straight over the mapped
+    pages, so nothing is copied until a value is read.
+    """
+
+    def __init__(self, path: str):
+        """
+        Maps a snapshot file and reads its header.
+        :param path: The name of the snapshot file
+        """
+        with open(path, "rb") as snap_f:
+            self._map = mmap.mmap(snap_f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        try:
+            self._read_header(path)
+        except ValueError:
+            self.close()
+            raise
+
+    def _read_header(self, path: str) -> None:
+        """
+        Reads the header and checks that it has everything the snapshot is read with and that every column it lists
+        is inside the file, so a snapshot that was cut short or damaged is rejected instead of failing when a column
+        is read.
+        :param path: The name of the snapshot file, for the error messages
+        :return: None
+        """
+        header_start = len(MAGIC) + 8
+        if len(self._map) < header_start or self._view[:len(MAGIC)] != MAGIC:
+            raise ValueError(path + " is not a snapshot file")
+        version, header_len = struct.unpack_from("<II", self._map, len(MAGIC))
+        if version != VERSION:
+            raise ValueError(path + " has snapshot version " + str(version) + ", expected " + str(VERSION))
+        if len(self._map) < header_start + header_len:
+            raise ValueError(path + " is cut off in its header")
+        self.header = json.loads(bytes(self._view[header_start:header_start + header_len]))
+        _check_header(self.header, path)
+        self._data_start = -(-(header_start + header_len) // ALIGNMENT) * ALIGNMENT
+        for name, info in self.header["columns"].items():
+            end = self._data_start + info["offset"] + info["length"]
+            if info["offset"] < 0 or info["length"] < 0 or end > len(self._map):
+                raise ValueError(path + " is cut off in column " + name)
+
+    def column(self, name: str) -> memoryview:
+        """
+        Gets one column of the snapshot without copying it.
+        :param name: The name of the column
+        :return: A memoryview cast to the column's type
+        """
+        info = self.header["columns"][name]
+        start = self._data_start + info["offset"]
+        return self._view[start:start + info["length"]].cast(info["typecode"])
+
+    def is_current(self, files: tuple) -> bool:
+        """
+        Checks that the files the snapshot was made from still have the same size, modification time and hash.
+        :param files: The names of the basics and ratings files
+        :return: True if the snapshot matches the files, False otherwise
+        """
+        sources = self.header["sources"]
+        if len(sources) != len(files):
+            return False
+        for source, file in zip(sources, files):
+            # The size and modification time are checked first since they don't require reading the file
+            try:
+                stat = os.stat(file)
+            except OSError:
+                return False
+            if stat.st_size != source["size"] or stat.st_mtime_ns != source["mtime_ns"]:
+                return False
+            if fingerprint(file)["sha256"] != source["sha256"]:
+                return False
+        return True
+
+    def close(self) -> None:
+        """
+        Unmaps the snapshot file. Any memoryviews handed out by column must have been released first.
+        :return: None
+        """
+        self._view.release()
+        self._map.close()
+
+
+def _is_int(value) -> bool:
+    """
+    Checks that a value from a JSON header is a whole number, which True and False aren't.
+    :param value: The value
+    :return: True if it's an int, False otherwise
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_header(header, path: str) -> None:
+    """
+    Checks that a snapshot header has the sources, code tables and columns the snapshot is read with, and that they
+    have the right types.
+    :param header: The header as it was decoded from JSON
+    :param path: The name of the snapshot file, for the error messages
+    :return: None
+    """
+    if not isinstance(header, dict):
+        raise ValueError(path + " has a header that isn't an object")
+    sources, tables, columns = header.get("sources"), header.get("tables"), header.get("columns")
+    if not isinstance(sources, list) or not all(
+            isinstance(source, dict) and _is_int(source.get("size")) and _is_int(source.get("mtime_ns"))
+            and isinstance(source.get("sha256"), str) for source in sources):
+        raise ValueError(path + " has missing or malformed sources in its header")
+    if not isinstance(tables, dict) or not all(
+            isinstance(table, list) and all(isinstance(code, str) for code in table) for table in tables.values()):
+        raise ValueError(path + " has missing or malformed code tables in its header")
+    if not isinstance(columns, dict):
+        raise ValueError(path + " has missing or malformed columns in its header")
+    for name, info in columns.items():
+        if not isinstance(info, dict) or info.get("typecode") not in tuple(typecodes):
+            raise ValueError(path + " has a malformed header for column " + name)
+        if not _is_int(info.get("offset")) or not _is_int(info.get("length")):
+            raise ValueError(path + " has a malformed header for column " + name)
+    titled = any(name.startswith("trigram_") for name in columns)
+    for name in STORE_COLUMNS + (TITLE_COLUMNS if titled else ()):
+        if name not in columns:
+            raise ValueError(path + " is missing column " + name)
+
+
+def load_snapshot(path: str, files: tuple, columnar=False, out_of_date=False):
+    """
+    Loads the movies and ratings from a snapshot file if it exists and is still current for the given dataset files.
+    :param path: The name of the snapshot file
+    :param files: The names of the basics and ratings files the snapshot should have been made from
+    :param columnar: True to get read only stores over the mapped file, False to get new dictionaries
+    :param out_of_date: True to load the snapshot even if the files have changed since, e.g. to refresh it
+    :return: A tuple of the movies, the ratings, the TitleSearch (None if it wasn't saved), whether the snapshot is
+                current, and if it isn't a tuple of dictionaries of tconst to the checksum of the line each title and
+                rating was read from (for refresh), otherwise None. None instead if there is no usable snapshot
+    """
+    if not os.path.exists(path):
+        return None
+    print("reading snapshot", path, "into", "stores..." if columnar else "dicts...")
+    start = timer()  # Starts timing
+    try:
+        snap = Snapshot(path)
+    except ValueError as error:
+        print("\tignoring snapshot:", error)
+        return None
+    with instrument.span("snapshot.check"):  # Hashes the dataset files
+        current = snap.is_current(files)
+    if not current:
+        print("\tsnapshot is out of date")
+        if not out_of_date:
+            snap.close()
+            return None
+
+    columns = {name: snap.column(name) for name in snap.header["columns"]}
+    movies = MovieStore(columns, snap.header["tables"])
+    ratings = RatingStore(columns)
+    titles = None
+    hashes = None
+    if not columnar:
+        # Copies everything out of the snapshot so it can be closed
+        with instrument.span("snapshot.copy"):
+            movies = {movie.movie_id: movie for movie in movies.values()}
+            ratings = {rating.movie_id: rating for rating in ratings.values()}
+            if not current:
+                hashes = (dict(zip(movies, columns["movie_line_hashes"])),
+                          dict(zip(ratings, columns["rating_line_hashes"])))
+            if "trigram_postings" in columns:
+                titles = TitleSearch.from_columns({name: _copy(column) for name, column in columns.items()
+                                                   if name.startswith("trigram_")})
+        for column in columns.values():
+            column.release()
+        snap.close()
+
+    elif "trigram_postings" in columns:
+        titles = TitleSearch.from_columns(columns)
+
+    elapsed = timer() - start  # Finds the elapsed time
+    instrument.add_span("snapshot.load", elapsed)
+    instrument.count("snapshot.load.movies", len(movies))
+    instrument.count("snapshot.load.ratings", len(ratings))
+    print("elapsed time (s):", elapsed)
+    return movies, ratings, titles, current, hashes
+
+
+def _copy(column: memoryview):
+    """
+    Copies a column out of the mapped file.
+    :param column: The column
+    :return: A bytearray for a byte column, otherwise an array of the column's type
+    """
+    if column.format == "B":
+        return bytearray(column)
+    copied = array(column.format)
+    copied.frombytes(column.cast("B"))
+    return copied
@@ -0,0 +1,127 @@
+"""
+Generates synthetic title.basics and title.ratings files in the same format as the IMDB dataset, at any number of
+titles, so the program can be tried at scales between the small dataset and the full one. The values are random but
+follow roughly the same distributions as the real files: most titles are TV episodes, more titles started in recent
+years, genres are mostly Drama, Comedy and Documentary, only some titles are rated, and the number of votes has a
+long tail where a few titles have millions. Titles are made from a list of common title words, so CONTAINS queries
+like the ones in input/ find matches. The same seed always gives the same files.
+
+$ python3 src/synthetic_data.py 100000 data/synthetic.basics.tsv data/synthetic.ratings.tsv
+
+Author: Luke Chelius
+"""
+import argparse  # ArgumentParser
+import random
+import sys  # argv
+
+# Title types and roughly how common they are in the real basics file
+TYPES = {"tvEpisode": 740, "short": 90, "movie": 65, "video": 27, "tvSeries": 24, "tvMovie": 14, "tvMiniSeries": 5,
+         "tvSpecial": 4, "videoGame": 3, "tvShort": 1}
+# Genres and roughly how common they are
+GENRES = {"Drama": 250, "Comedy": 180, "Documentary": 100, "Romance": 50, "Action": 50, "Animation": 50, "Crime": 50,
+          "Adventure": 40, "Family": 40, "Talk-Show": 40, "Reality-TV": 40, "Music": 30, "News": 30, "Thriller": 30,
+          "Game-Show": 20, "Horror": 20, "Mystery": 20, "Fantasy": 20, "Sport": 20, "History": 20, "Biography": 20,
+          "Sci-Fi": 15, "Short": 10, "Musical": 10, "Western": 5, "War": 5, "Film-Noir": 1}
+# Mean and spread of the runtime in minutes for each type
+RUNTIMES = {"tvEpisode": (30, 15), "short": (10, 6), "movie": (95, 25), "video": (60, 30), "tvSeries": (40, 15),
+            "tvMovie": (85, 20), "tvMiniSeries": (50, 20), "tvSpecial": (60, 30), "videoGame": (0, 0),
+            "tvShort": (8, 5)}
+# The chance that a title of each type is rated
+RATED = {"tvEpisode": 0.08, "short": 0.15, "movie": 0.5, "video": 0.2, "tvSeries": 0.4, "tvMovie": 0.4,
+         "tvMiniSeries": 0.4, "tvSpecial": 0.3, "videoGame": 0.5, "tvShort": 0.15}
+WORDS = ("The", "A", "Of", "Love", "Night", "Day", "Man", "Woman", "Life", "Story", "Last", "First", "Dark", "Star",
+         "City", "Home", "World", "King", "Girl", "Boy", "Time", "House", "Black", "White", "Blue", "Red", "Dead",
+         "Summer", "Winter", "Christmas", "Secret", "Lost", "Big", "Little", "Return", "War", "Heart", "Dream",
+         "Avengers", "Spider", "Batman", "Starman", "Godfather", "Shining", "Wars", "Adventures", "Episode", "#1.1",
+         "Café", "Amélie", "Lebowski", "Philadelphia", "Silent", "Hill", "Rain", "Blood", "Moon", "Sun", "Fire")
+FIRST_YEAR = 1874  # The earliest start year in the real dataset
+LAST_YEAR = 2024  # The latest start year generated
+TITLE_SPREAD = 20000000  # Tconsts are spread out up to about this number, like the real ones
+
+
+def _year(rng: random.Random) -> int:
+    """
+    Picks a start year, with recent years being much more common.
+    :param rng: The random number generator
+    :return: The year
+    """
+    return max(FIRST_YEAR, LAST_YEAR - int(rng.expovariate(1 / 15)))
+
+
+def _genres(rng: random.Random) -> str:
+    """
+    Picks one to three different genres.
+    :param rng: The random number generator
+    :return: The genres separated by commas, in alphabetical order like the real file
+    """
+    picked = set(rng.choices(list(GENRES), list(GENRES.values()), k=rng.choice((1, 1, 2, 3))))
+    return ",".join(sorted(picked))
+
+
+def generate(rows: int, basics_file: str, ratings_file: str, seed: int = 140) -> tuple:
+    """
+    Writes a synthetic basics file and ratings file.
+    :param rows: The number of titles in the basics file
+    :param basics_file: The name of the basics file to write
+    :param ratings_file: The name of the ratings file to write
+    :param seed: The seed for the random numbers
+    :return: A tuple of the number of titles and the number of ratings written
+    """
+    rng = random.Random(seed)
+    types = rng.choices(list(TYPES), list(TYPES.values()), k=rows)
+    gap = max(1, TITLE_SPREAD // max(rows, 1))  # Largest gap between neighbouring tconsts
+    number = 0
+    num_ratings = 0
+    with open(basics_file, "w", encoding="utf-8", newline="\n") as basics, \
+            open(ratings_file, "w", encoding="utf-8", newline="\n") as ratings:
+        basics.write("tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\truntimeMinutes"
+                     "\tgenres\n")
+        ratings.write("tconst\taverageRating\tnumVotes\n")
+        title_lines = []
+        rating_lines = []
+        for title_type in types:
+            number += rng.randint(1, gap)
+            tconst = "tt%07d" % number
+            title = " ".join(rng.choices(WORDS, k=rng.randint(1, 4)))
+            original = title if rng.random() < 0.85 else title + " (original)"
+            adult = "1" if rng.random() < 0.02 else "0"
+            start_year = str(_year(rng)) if rng.random() < 0.9 else "\\N"
+            end_year = "\\N"
+            if title_type in ("tvSeries", "tvMiniSeries") and start_year != "\\N" and rng.random() < 0.5:
+                end_year = str(min(LAST_YEAR, int(start_year) + int(rng.expovariate(1 / 4))))
+            mean, spread = RUNTIMES[title_type]
+            runtime = str(max(1, int(rng.gauss(mean, spread)))) if mean > 0 and rng.random() < 0.7 else "\\N"
+            genres = _genres(rng) if rng.random() < 0.9 else "\\N"
+            title_lines.append("\t".join((tconst, title_type, title, original, adult, start_year, end_year, runtime,
+                                          genres)) + "\n")
+
+            if rng.random() < RATED[title_type]:
+                rating = min(10.0, max(1.0, rng.gauss(6.9, 1.3)))
+                votes = min(3000000, int(5 * rng.paretovariate(0.7)))
+                rating_lines.append("%s\t%.1f\t%d\n" % (tconst, rating, votes))
+            # Writes in pieces so the lines for a large file aren't all kept in memory
+            if len(title_lines) >= 100000:
+                basics.writelines(title_lines)
+                ratings.writelines(rating_lines)
+                num_ratings += len(rating_lines)
+                title_lines.clear()
+                rating_lines.clear()
+        basics.writelines(title_lines)
+        ratings.writelines(rating_lines)
+        num_ratings += len(rating_lines)
+    return rows, num_ratings
+
+
+def main(args=sys.argv):
+    parser = argparse.ArgumentParser(description="Generates synthetic IMDB basics and ratings files.")
+    parser.add_argument("rows", type=int, help="number of titles to generate")
+    parser.add_argument("basics", help="basics file to write")
+    parser.add_argument("ratings", help="ratings file to write")
+    parser.add_argument("--seed", type=int, default=140, help="seed for the random numbers")
+    options = parser.parse_args(args[1:])
+    titles, ratings = generate(options.rows, options.basics, options.ratings, options.seed)
+    print("wrote", titles, "titles and", ratings, "ratings")
+
+
+if __name__ == '__main__':
+    main()
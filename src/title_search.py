@@ -0,0 +1,157 @@
+"""
+A trigram index of the primary titles for CONTAINS. Every run of three characters in a title is a trigram, and for
+each title type the index lists the titles each trigram appears in. Any title containing the searched words must
+contain every trigram of the words, so intersecting those lists leaves only a few titles to check with an actual
+substring test. The index is kept in flat arrays (the sorted keys in a string pool, then the lists one after another)
+so it can be saved in a snapshot and used straight from the mapped file. Movies that change after it's built are
+kept track of separately, since the arrays can't be changed in place.
+
+Author: Luke Chelius
+"""
+from array import array
+from bisect import bisect_left, insort
+from movie_store import StringPool, movie_rows
+
+GRAM = 3  # Number of characters in a trigram
+
+
+def trigrams(text: str) -> set:
+    """
+    Finds every run of three characters in some text.
+    :param text: The text to split up
+    :return: A set of the trigrams, empty if the text is shorter than three characters
+    """
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class TitleSearch:
+    """
+    For each title type, the positions of the movies whose primary title contains each trigram.
+    """
+
+    def __init__(self, keys: StringPool, offsets, postings):
+        """
+        Makes the index from its arrays, either just built or from a snapshot.
+        :param keys: The "type<tab>trigram" keys in sorted order
+        :param offsets: Where each key's positions start in postings, plus the end of the last one
+        :param postings: The positions of the movies for every key, each key's in increasing order
+        """
+        self.keys = keys
+        self.offsets = offsets
+        self.postings = postings
+        self.added = {}  # Key to the sorted positions of movies added or changed since the arrays were built
+        self.removed = set()  # Positions in the arrays of movies deleted or changed since they were built
+
+    @classmethod
+    def build(cls, movies):
+        """
+        Builds the index for a dictionary of movies or a MovieStore.
+        :param movies: The dictionary (or MovieStore) containing all the titles from the movie dataset
+        :return: The TitleSearch
+        """
+        grams = {}  # "type<tab>trigram" to the positions of the movies whose title contains it
+        for position, movie in enumerate(movie_rows(movies)[0]):
+            for gram in trigrams(movie.primary_title):
+                grams.setdefault(movie.title_type + "\t" + gram, array("I")).append(position)
+
+        keys = StringPool()
+        offsets = array("q", [0])
+        postings = array("I")
+        for key in sorted(grams):
+            keys.add(key)
+            postings.extend(grams[key])
+            offsets.append(len(postings))
+        return cls(keys, offsets, postings)
+
+    def columns(self) -> dict:
+        """
+        Gets the arrays the index is made of, e.g. to save them in a snapshot. Movies added or discarded since it was
+        built aren't in them.
+        :return: A dictionary of column name to array or bytes-like object
+        """
+        return {"trigram_keys": self.keys.data, "trigram_key_offsets": self.keys.offsets,
+                "trigram_offsets": self.offsets, "trigram_postings": self.postings}
+
+    @classmethod
+    def from_columns(cls, columns: dict):
+        """
+        Makes the index from the columns of a snapshot.
+        :param columns: The columns given by the columns method
+        :return: The TitleSearch
+        """
+        return cls(StringPool(columns["trigram_keys"], columns["trigram_key_offsets"]), columns["trigram_offsets"],
+                   columns["trigram_postings"])
+
+    def _postings(self, key: str):
+        """
+        Finds the positions listed for a key with a binary search through the sorted keys.
+        :param key: The "type<tab>trigram" key
+        :return: The positions, empty if the key isn't in the index
+        """
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return ()
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def find(self, movie_type: str, words: str):
+        """
+        Finds the movies of a type whose primary title could contain some words.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param words: The words being looked for
+        :return: A sorted list of the positions of the movies, or None if the words are too short to narrow it down
+        """
+        grams = trigrams(words)
+        if not grams:
+            return None
+        keys = [movie_type + "\t" + gram for gram in grams]
+        lists = sorted(map(self._postings, keys), key=len)
+        found = lists[0]
+        for postings in lists[1:]:
+            if not found:
+                break
+            # Binary searches the longer list for the few positions left if it's much longer, otherwise uses a set
+            if len(found) * 16 < len(postings):
+                found = [position for position in found if _has(postings, position)]
+            else:
+                found = sorted(set(found).intersection(postings))
+        if not self.added and not self.removed:
+            return list(found)
+
+        # Movies changed since the arrays were built are only found through the lists of added positions
+        found = [position for position in found if position not in self.removed]
+        added = [self.added.get(key, ()) for key in keys]
+        return sorted(set(found).union(set(added[0]).intersection(*added[1:])))
+
+    def add(self, position: int, movie) -> None:
+        """
+        Adds a movie that was inserted or changed after the index was built.
+        :param position: The position of the movie
+        :param movie: The Movie object
+        :return: None
+        """
+        for gram in trigrams(movie.primary_title):
+            insort(self.added.setdefault(movie.title_type + "\t" + gram, []), position)
+
+    def discard(self, position: int, movie) -> None:
+        """
+        Takes out a movie that is being deleted or changed.
+        :param position: The position of the movie
+        :param movie: The Movie object as it was added to the index
+        :return: None
+        """
+        for gram in trigrams(movie.primary_title):
+            positions = self.added.get(movie.title_type + "\t" + gram)
+            if positions and _has(positions, position):
+                positions.remove(position)
+        self.removed.add(position)
+
+
+def _has(postings, position: int) -> bool:
+    """
+    Checks if a position is in a sorted list of positions.
+    :param postings: The sorted positions
+    :param position: The position to look for
+    :return: True if it's there, False otherwise
+    """
+    i = bisect_left(postings, position)
+    return i < len(postings) and postings[i] == position
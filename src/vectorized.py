@@ -0,0 +1,222 @@
+"""
+Answers YEAR_AND_GENRE, RUNTIME, MOST_VOTES and TOP with NumPy instead of going through the movies one Movie object
+at a time. The fields the queries look at are copied once into NumPy arrays in dictionary order, with the votes and
+rating of each movie in arrays lined up with them (-1 votes for a movie without a rating), so a query is a few
+boolean masks over whole arrays. The results are ordered with np.lexsort, which is stable like list.sort, on the
+same keys the queries sort by, with each title replaced by its place in the sorted list of titles.
+
+MOST_VOTES and TOP keep the results of the bounded search the queries have always done: when movies that tie on
+the compared values straddle the cut off (found with np.partition or the sorted order), just the tied movies and the
+ones ahead of them are searched the old way in dictionary order, like the rankings in rankings.py do.
+
+NumPy isn't part of the standard library, so when it isn't installed the engine can't be made and the queries are
+evaluated in Python as usual. The engine has to be made again whenever the movies or ratings change.
+
+Author: Luke Chelius
+"""
+from bisect import insort
+from movie_store import RatingStore, movie_rows, tconst_number
+from rankings import MIN_TOP_VOTES
+from timeit import default_timer as timer
+
+try:
+    import numpy as np  # Not part of the standard library
+except ImportError:
+    np = None
+
+INT64 = range(-2 ** 63, 2 ** 63)  # The numbers the arrays can be compared with
+
+
+class VectorEngine:
+    """
+    NumPy arrays of the fields of the movies and their ratings, in dictionary order.
+    """
+
+    def __init__(self, movies, ratings):
+        """
+        Copies the fields the queries use into arrays.
+        :param movies: The dictionary (or MovieStore) containing all the titles from the movie dataset
+        :param ratings: The dictionary (or RatingStore) containing all the ratings from the rating dataset
+        """
+        if np is None:
+            raise ImportError("the vectorized queries need numpy")
+        print("building arrays...")
+        start = timer()  # Starts timing
+        values, self._movie = movie_rows(movies)
+        values = list(values)
+        self._ratings = ratings
+        size = len(values)
+
+        self._type_codes = {}  # Title type to its code in the types array
+        self._types = np.fromiter((self._type_codes.setdefault(movie.title_type, len(self._type_codes))
+                                   for movie in values), np.int64, size)
+        self._start = np.fromiter((movie.start_year for movie in values), np.int64, size)
+        self._runtime = np.fromiter((movie.run_time_mins for movie in values), np.int64, size)
+        genre_codes = {}  # Genres string to its code in the genres array
+        self._genres = np.fromiter((genre_codes.setdefault(movie.genres, len(genre_codes)) for movie in values),
+                                   np.int64, size)
+        self._genre_values = list(genre_codes)
+        # Each title's place among the different titles, which sorts the same way as the title itself
+        places = {title: place for place, title in enumerate(sorted({movie.primary_title for movie in values}))}
+        self._titles = np.fromiter((places[movie.primary_title] for movie in values), np.int64, size)
+
+        if isinstance(ratings, RatingStore):
+            # Finds the row of every movie's rating in one go and takes the columns of those rows
+            rows = np.array(ratings.rows([tconst_number(movie.movie_id) for movie in values]), np.int64)
+            columns = ratings.columns()
+            rated = rows >= 0
+            self._votes = np.full(size, -1, np.int64)
+            self._votes[rated] = np.asarray(columns["num_votes"], np.int64)[rows[rated]]
+            self._averages = np.zeros(size)
+            self._averages[rated] = np.asarray(columns["average_ratings"], np.float64)[rows[rated]] / 10
+        else:
+            found = [ratings.get(movie.movie_id) for movie in values]
+            self._votes = np.fromiter((-1 if rating is None else rating.num_votes for rating in found), np.int64,
+                                      size)
+            self._averages = np.fromiter((0.0 if rating is None else rating.average_rating for rating in found),
+                                         np.float64, size)
+
+        elapsed = timer() - start  # Finds the elapsed time
+        print("elapsed time (s):", elapsed)
+
+    def _of_type(self, movie_type: str):
+        """
+        Finds which movies are of a type.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :return: A boolean mask, or None if no movie is of the type
+        """
+        code = self._type_codes.get(movie_type)
+        return None if code is None else self._types == code
+
+    def _rating(self, position: int):
+        """
+        Gets the rating of the movie at a position.
+        :param position: The position of the movie
+        :return: The Rating object
+        """
+        return self._ratings[self._movie(position).movie_id]
+
+    def year_and_genre(self, movie_type: str, year: int, genre: str):
+        """
+        Finds the movies of a type that started in a year and have a genre, like Queries.find_year_and_genre.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param year: The start year of the movies being searched for
+        :param genre: The genre of the movies being searched for
+        :return: A list of the Movie objects sorted alphabetically by title, or None if the engine can't answer
+        """
+        if year not in INT64:
+            return None
+        mask = self._of_type(movie_type)
+        if mask is None:
+            return []
+        # The genres are matched the same way as the queries do, as part of the genres string
+        has_genre = np.array([genre in genres for genres in self._genre_values], bool)
+        positions = np.flatnonzero(mask & (self._start == year) & has_genre[self._genres])
+        positions = positions[np.argsort(self._titles[positions], kind="stable")]
+        return [self._movie(position) for position in positions.tolist()]
+
+    def runtime(self, movie_type: str, min_mins: int, max_mins: int):
+        """
+        Finds the movies of a type with a runtime in a range, like Queries.find_runtime.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param min_mins: The minimum runtime for the movie
+        :param max_mins: The maximum runtime for the movie
+        :return: A list of the Movie objects, longest first and alphabetically by title for the same runtime, or None
+                    if the engine can't answer
+        """
+        if min_mins not in INT64 or max_mins not in INT64:
+            return None
+        mask = self._of_type(movie_type)
+        if mask is None:
+            return []
+        positions = np.flatnonzero(mask & (self._runtime >= min_mins) & (self._runtime <= max_mins))
+        positions = positions[np.lexsort((self._titles[positions], -self._runtime[positions]))]
+        return [self._movie(position) for position in positions.tolist()]
+
+    def most_votes(self, movie_type: str, num: int):
+        """
+        Finds the rated movies of a type with the most votes, like Queries.find_most_votes.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param num: The number of movies to find
+        :return: A list of the Rating objects ordered by most votes then title, or None if the engine can't answer
+        """
+        if num <= 0:
+            return None  # The bounded search doesn't give an empty list for these, so they are left to it
+        mask = self._of_type(movie_type)
+        if mask is None:
+            return []
+        positions = np.flatnonzero(mask & (self._votes >= 0))
+        votes = self._votes[positions]
+        if len(positions) > num:
+            cut_off = np.partition(votes, len(votes) - num)[len(votes) - num]  # The votes of the num-th movie
+            kept = votes >= cut_off
+            positions, votes = positions[kept], votes[kept]
+            if len(positions) > num:
+                # Movies tied at the cut off are kept the way the bounded search would have kept them
+                return self._bounded(positions, num, votes.tolist(),
+                                     list(zip((-votes).tolist(), self._titles[positions].tolist())))
+        positions = positions[np.lexsort((self._titles[positions], -votes))]
+        return [self._rating(position) for position in positions.tolist()]
+
+    def top(self, movie_type: str, num: int, begin_year: int, stop_year: int):
+        """
+        Finds the highest rated movies of a type with at least 1000 votes for each year in a range, like
+        Queries.find_top.
+        :param movie_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param num: The number of movies to find for each year
+        :param begin_year: The year to begin finding movies at (inclusive)
+        :param stop_year: The year to stop finding movies at (inclusive)
+        :return: A list with a list of Rating objects for each year from begin_year to stop_year, ordered by highest
+                    rating, most votes, then title, or None if the engine can't answer
+        """
+        if num <= 0 or begin_year not in INT64 or stop_year not in INT64:
+            return None
+        mask = self._of_type(movie_type)
+        if mask is None or stop_year < begin_year:
+            return [[] for _ in range(stop_year - begin_year + 1)]
+        positions = np.flatnonzero(mask & (self._votes >= MIN_TOP_VOTES) & (self._start >= begin_year) &
+                                   (self._start <= stop_year))
+        # Groups the movies by year, keeping them in dictionary order within each year
+        positions = positions[np.argsort(self._start[positions], kind="stable")]
+        bounds = np.searchsorted(self._start[positions], np.arange(begin_year, stop_year + 2)).tolist()
+        return [self._top_of_year(positions[start:end], num) for start, end in zip(bounds, bounds[1:])]
+
+    def _top_of_year(self, positions, num: int) -> list:
+        """
+        Picks the highest rated movies out of the ones from a year.
+        :param positions: The positions of the movies that could be picked, in dictionary order
+        :param num: The number of movies to pick, at least 1
+        :return: A list of the Rating objects ordered by highest rating, most votes, then title
+        """
+        averages, votes = self._averages[positions], self._votes[positions]
+        order = np.lexsort((self._titles[positions], -votes, -averages))
+        if len(positions) > num:
+            last = order[num - 1]  # The movie at the cut off
+            kept = (averages > averages[last]) | ((averages == averages[last]) & (votes >= votes[last]))
+            if np.count_nonzero(kept) > num:
+                # Movies tied at the cut off are kept the way the bounded search would have kept them
+                positions, averages, votes = positions[kept], averages[kept], votes[kept]
+                return self._bounded(positions, num, list(zip(averages.tolist(), votes.tolist())),
+                                     list(zip((-averages).tolist(), (-votes).tolist(),
+                                              self._titles[positions].tolist())))
+            order = order[:num]
+        return [self._rating(position) for position in positions[order].tolist()]
+
+    def _bounded(self, positions, num: int, compared: list, keys: list) -> list:
+        """
+        Goes through some movies in dictionary order, only letting a movie replace the last one kept if it is
+        strictly better, the way the queries search.
+        :param positions: The positions of the movies, in dictionary order
+        :param num: The number of movies to keep
+        :param compared: The values each movie has to beat the last one kept on
+        :param keys: The values each movie is ordered by in the results
+        :return: A list of the Rating objects of the movies kept, in order
+        """
+        kept = []  # Sorted list of (key, order found, compared value, position)
+        for found, (position, value, key) in enumerate(zip(positions.tolist(), compared, keys)):
+            if len(kept) < num:
+                insort(kept, (key, found, value, position))
+            elif value > kept[-1][2]:
+                kept.pop()
+                insort(kept, (key, found, value, position))
+        return [self._rating(entry[3]) for entry in kept]
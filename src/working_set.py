@@ -0,0 +1,70 @@
+"""
+Works out which part of the dataset a batch of queries needs, so only those titles have to be read. Every query
+other than LOOKUP only looks at titles of one type, and YEAR_AND_GENRE, TOP and STATS only at some start years of it,
+while LOOKUP needs one exact title. No query uses the original title or end year, so those are left out as well.
+
+Author: Luke Chelius
+"""
+import Queries  # parse_query
+ALL_YEARS = None  # Stands for every start year of a type
+
+
+class WorkingSet:
+    """
+    The title types, start years and tconsts a batch of queries needs.
+    """
+
+    def __init__(self, queries: list):
+        """
+        Goes through the queries to find what they need. Lines that can't be read as a query are skipped here and
+        fail when they are performed, the same as before.
+        :param queries: The lines of the query file
+        """
+        self.tconsts = set()  # Titles needed by LOOKUP
+        self.years = {}  # Type to a list of (first, last) start year ranges, or ALL_YEARS
+        for line in queries:
+            # Reads the line the same way as performing it will, so the lines that can't be read are the same ones
+            try:
+                query = Queries.parse_query(line)
+            except (IndexError, ValueError):
+                continue
+            if query is None:
+                continue
+            elif query[0] == "LOOKUP":
+                self.tconsts.add(query[1])
+            elif query[0] in ("CONTAINS", "RUNTIME", "MOST_VOTES", "HISTOGRAM"):
+                self._add(query[1], ALL_YEARS)
+            elif query[0] == "YEAR_AND_GENRE":
+                self._add(query[1], (query[2], query[2]))
+            elif query[0] in ("TOP", "STATS"):
+                self._add(query[1], (query[3], query[4]))
+
+    def _add(self, title_type: str, years) -> None:
+        """
+        Adds a range of start years of a type to the working set.
+        :param title_type: The type of the movie i.e. short, movie, tvEpisode, videoGame, etc.
+        :param years: A (first, last) tuple of start years (inclusive), or ALL_YEARS
+        :return: None
+        """
+        if years is ALL_YEARS or self.years.get(title_type, []) is ALL_YEARS:
+            self.years[title_type] = ALL_YEARS
+        else:
+            self.years.setdefault(title_type, []).append(years)
+
+    def keeps(self, tconst: str, title_type: str, start_year: str) -> bool:
+        """
+        Checks if a title from the basics file is needed.
+        :param tconst: The tconst of the title
+        :param title_type: The type of the title
+        :param start_year: The start year as it's written in the file, "\\N" if it's missing
+        :return: True if a query needs the title, False otherwise
+        """
+        if tconst in self.tconsts:
+            return True
+        if title_type not in self.years:
+            return False
+        ranges = self.years[title_type]
+        if ranges is ALL_YEARS:
+            return True
+        year = 0 if start_year == "\\N" else int(start_year)
+        return any(first <= year <= last for first, last in ranges)
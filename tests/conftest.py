@@ -0,0 +1,7 @@
+"""
+Lets the tests import the modules in src the same way they import each other.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
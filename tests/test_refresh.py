@@ -0,0 +1,206 @@
+"""
+Tests that refreshing loaded movies and ratings from newer dataset files ends up the same as reading the newer files
+from scratch, including the index built over them.
+
+Author: Luke Chelius
+"""
+from indexes import MovieIndex
+import Queries  # cache, engine, rollups
+from read_files import line_hashes, read_f
+from refresh import refresh
+from rollups import Rollups
+import pytest
+import snapshot
+
+BASICS_HEADER = "tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\truntimeMinutes\tgenres"
+RATINGS_HEADER = "tconst\taverageRating\tnumVotes"
+
+OLD_BASICS = [
+    "tt0000001\tmovie\tThe Shining\tThe Shining\t0\t1980\t\\N\t146\tDrama,Horror",
+    "tt0000002\tmovie\tVertigo\tVertigo\t0\t1958\t\\N\t128\tMystery,Romance,Thriller",
+    "tt0000003\tshort\tThe Kiss\tThe Kiss\t0\t1896\t\\N\t1\tRomance,Short",
+    "tt0000004\tmovie\tStarman\tStarman\t0\t1984\t\\N\t115\tDrama,Romance,Sci-Fi",
+    "tt0000005\tmovie\tAlien\tAlien\t0\t1979\t\\N\t117\tHorror,Sci-Fi",
+    "tt0000006\ttvEpisode\tPilot\tPilot\t0\t1990\t\\N\t\\N\t\\N",
+]
+OLD_RATINGS = [
+    "tt0000001\t8.4\t1000000",
+    "tt0000002\t8.3\t400000",
+    "tt0000004\t7.0\t50000",
+    "tt0000005\t8.5\t900000",
+]
+
+
+def write(path, header: str, lines: list) -> str:
+    """
+    Writes a dataset file.
+    :param path: The pathlib.Path of the file
+    :param header: The header line of the file
+    :param lines: The lines after the header
+    :return: The name of the file
+    """
+    path.write_text("\n".join([header] + lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def read(files: tuple) -> tuple:
+    """
+    Reads a pair of dataset files the way movies_main does.
+    :param files: The names of the basics and ratings files
+    :return: A tuple of the dictionaries of movies and ratings
+    """
+    movies = read_f(files[0], True)
+    return movies, read_f(files[1], False, movies)
+
+
+def by_tconst(index: MovieIndex) -> list:
+    """
+    Finds what an index holds with the positions turned into tconsts, so indexes of the same movies can be compared
+    even if their positions differ.
+    :param index: The MovieIndex
+    :return: A list of the contents of the index
+    """
+    def tconsts(positions):
+        return [movie.movie_id for movie in index.movies(positions)]
+
+    contents = [{key: tconsts(positions) for key, positions in partition.items() if len(positions)}
+                for partition in (index.by_type, index.by_type_year, index.by_genre,
+                                  index.rankings.by_votes, index.rankings.by_rating)]
+    contents.append({title_type: (list(runtimes), tconsts(positions))
+                     for title_type, (runtimes, positions) in index.runtimes.items() if len(runtimes)})
+    for title_type in sorted(index.by_type):
+        for words in ("the", "Redux", "star"):
+            contents.append(sorted(movie.movie_id for movie in index.of_type_containing(title_type, words)
+                                   if words.lower() in movie.primary_title.lower()))
+    return contents
+
+
+@pytest.fixture(autouse=True)
+def no_query_state():
+    """
+    Makes sure nothing is left in the query module from another test.
+    """
+    Queries.set_cache(None)
+    Queries.set_engine(None)
+    Queries.set_rollups(None)
+    yield
+    Queries.set_cache(None)
+    Queries.set_engine(None)
+    Queries.set_rollups(None)
+
+
+@pytest.fixture
+def old_files(tmp_path) -> tuple:
+    """
+    Writes the dataset files the movies are loaded from at first.
+    """
+    return (write(tmp_path / "old.basics.tsv", BASICS_HEADER, OLD_BASICS),
+            write(tmp_path / "old.ratings.tsv", RATINGS_HEADER, OLD_RATINGS))
+
+
+@pytest.fixture(params=[False, True], ids=["parsed", "hashed"])
+def hashed(request) -> bool:
+    """
+    Runs a test once parsing every line of the new files and once with the checksums of the old lines.
+    """
+    return request.param
+
+
+def refreshed(old_files: tuple, new_files: tuple, hashed: bool, index=False) -> tuple:
+    """
+    Loads the old files and refreshes them from the new ones.
+    :param old_files: The names of the old basics and ratings files
+    :param new_files: The names of the new basics and ratings files
+    :param hashed: True to give refresh the checksums of the lines of the old files
+    :param index: True to build a MovieIndex over the old movies and refresh it too
+    :return: A tuple of the refreshed movies, ratings and MovieIndex (or None)
+    """
+    movies, ratings = read(old_files)
+    hashes = (line_hashes(old_files[0], movies), line_hashes(old_files[1], ratings)) if hashed else None
+    built = MovieIndex(movies, ratings) if index else None
+    built = refresh(new_files, movies, ratings, built, hashes)
+    return movies, ratings, built
+
+
+def test_titles_added_removed_and_changed(tmp_path, old_files, hashed):
+    new_basics = [OLD_BASICS[0],
+                  OLD_BASICS[1].replace("Vertigo\tVertigo", "Vertigo Redux\tVertigo"),  # Changed
+                  # tt0000003 is deleted
+                  OLD_BASICS[3],
+                  OLD_BASICS[4].replace("\t0\t1979", "\t1\t1979"),  # Became adult, so it's deleted too
+                  OLD_BASICS[5],
+                  "tt0000007\tmovie\tStarman Returns\tStarman Returns\t0\t1990\t\\N\t100\tSci-Fi",  # Added
+                  "tt0000008\tmovie\tHidden\tHidden\t1\t1990\t\\N\t100\tDrama"]  # Added but adult
+    new_ratings = OLD_RATINGS[:2] + ["tt0000004\t7.1\t50001", OLD_RATINGS[3], "tt0000007\t6.0\t2000",
+                                     "tt0000008\t5.0\t10"]
+    new_files = (write(tmp_path / "new.basics.tsv", BASICS_HEADER, new_basics),
+                 write(tmp_path / "new.ratings.tsv", RATINGS_HEADER, new_ratings))
+    movies, ratings, _ = refreshed(old_files, new_files, hashed)
+    fresh_movies, fresh_ratings = read(new_files)
+
+    assert list(movies.items()) == list(fresh_movies.items())
+    assert list(ratings.items()) == list(fresh_ratings.items())
+    assert movies["tt0000002"].primary_title == "Vertigo Redux"
+    assert "tt0000003" not in movies and "tt0000005" not in movies and "tt0000005" not in ratings
+    assert ratings["tt0000004"].num_votes == 50001
+    assert "tt0000007" in ratings and "tt0000008" not in movies and "tt0000008" not in ratings
+
+
+def test_rating_added_for_old_title(tmp_path, old_files, hashed):
+    # tt0000003 was already loaded without a rating, so its new rating goes before tt0000004's
+    new_ratings = OLD_RATINGS[:2] + ["tt0000003\t5.5\t1500"] + OLD_RATINGS[2:]
+    new_files = (write(tmp_path / "new.basics.tsv", BASICS_HEADER, OLD_BASICS),
+                 write(tmp_path / "new.ratings.tsv", RATINGS_HEADER, new_ratings))
+    movies, ratings, _ = refreshed(old_files, new_files, hashed)
+    fresh_movies, fresh_ratings = read(new_files)
+
+    assert list(movies.items()) == list(fresh_movies.items())
+    assert list(ratings.items()) == list(fresh_ratings.items())
+    assert ratings["tt0000003"].num_votes == 1500
+
+
+@pytest.mark.parametrize("inserted", ["tt0000009", "tt0000000"], ids=["after", "before"])
+def test_refreshed_index_matches_fresh_one(tmp_path, old_files, hashed, inserted):
+    new_basics = [OLD_BASICS[0].replace("\t146\t", "\t144\t"),  # Changed runtime
+                  OLD_BASICS[1].replace("\t1958\t", "\t1959\t"),  # Changed year
+                  OLD_BASICS[2],
+                  # tt0000004 is deleted
+                  OLD_BASICS[4].replace("Horror,Sci-Fi", "Horror"),  # Changed genres
+                  OLD_BASICS[5],
+                  inserted + "\tmovie\tThe Star Redux\tThe Star Redux\t0\t1980\t\\N\t146\tDrama,Horror"]
+    if inserted < "tt0000001":
+        new_basics.insert(0, new_basics.pop())  # Out of order, so the index is built again
+    new_ratings = ["tt0000001\t8.4\t1000001", OLD_RATINGS[1], "tt0000003\t6.0\t2000", OLD_RATINGS[3]]
+    new_ratings.append(inserted + "\t8.4\t1000001")
+    new_ratings.sort()
+    new_files = (write(tmp_path / "new.basics.tsv", BASICS_HEADER, new_basics),
+                 write(tmp_path / "new.ratings.tsv", RATINGS_HEADER, new_ratings))
+    old_movies, old_ratings = read(old_files)
+    Queries.set_rollups(Rollups(old_movies.values(), old_ratings))
+    movies, ratings, index = refreshed(old_files, new_files, hashed, index=True)
+    fresh_movies, fresh_ratings = read(new_files)
+
+    assert list(movies.items()) == list(fresh_movies.items())
+    assert by_tconst(index) == by_tconst(MovieIndex(fresh_movies, fresh_ratings))
+    assert index.rankings.most_votes("movie", 10) == MovieIndex(fresh_movies, fresh_ratings).rankings.most_votes(
+        "movie", 10)
+    fresh_rollups = Rollups(fresh_movies.values(), fresh_ratings)
+    assert Queries.rollups.stats("movie", "Horror", 1900, 2000) == fresh_rollups.stats("movie", "Horror", 1900, 2000)
+    assert Queries.rollups.histogram("movie", "runtime", 4) == fresh_rollups.histogram("movie", "runtime", 4)
+
+
+def test_snapshot_keeps_line_hashes_for_refresh(tmp_path, old_files):
+    path = str(tmp_path / "movies.snap")
+    movies, ratings = read(old_files)
+    snapshot.save_snapshot(path, movies, ratings, old_files)
+    saved = (line_hashes(old_files[0], movies), line_hashes(old_files[1], ratings))
+    new_basics = OLD_BASICS[:2] + [OLD_BASICS[2].replace("The Kiss", "The Kiss Redux")] + OLD_BASICS[3:]
+    new_files = (write(tmp_path / "old.basics.tsv", BASICS_HEADER, new_basics), old_files[1])
+
+    movies, ratings, titles, current, hashes = snapshot.load_snapshot(path, new_files, out_of_date=True)
+    assert not current
+    assert hashes == saved
+    refresh(new_files, movies, ratings, hashes=hashes)
+    fresh_movies, fresh_ratings = read(new_files)
+    assert list(movies.items()) == list(fresh_movies.items())
+    assert list(ratings.items()) == list(fresh_ratings.items())
@@ -0,0 +1,105 @@
+"""
+Tests that snapshot files that are damaged are rejected with a ValueError, so load_snapshot ignores them.
+
+Author: Luke Chelius
+"""
+from read_files import read_f
+import json
+import pytest
+import snapshot
+import struct
+
+BASICS = ("tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\truntimeMinutes\tgenres\n"
+          "tt0000001\tmovie\tThe Shining\tThe Shining\t0\t1980\t\\N\t146\tDrama,Horror\n")
+RATINGS = "tconst\taverageRating\tnumVotes\ntt0000001\t8.4\t1000000\n"
+
+
+@pytest.fixture
+def saved(tmp_path) -> tuple:
+    """
+    Saves a snapshot of a single movie.
+    :return: A tuple of the name of the snapshot file and the names of the files it was made from
+    """
+    (tmp_path / "basics.tsv").write_text(BASICS, encoding="utf-8")
+    (tmp_path / "ratings.tsv").write_text(RATINGS, encoding="utf-8")
+    files = (str(tmp_path / "basics.tsv"), str(tmp_path / "ratings.tsv"))
+    movies = read_f(files[0], True)
+    path = str(tmp_path / "movies.snap")
+    snapshot.save_snapshot(path, movies, read_f(files[1], False, movies), files)
+    return path, files
+
+
+def rewrite_header(path: str, change) -> None:
+    """
+    Changes the JSON header of a snapshot file in place, written without spaces and then padded with them to keep the
+    columns where they are.
+    :param path: The name of the snapshot file
+    :param change: Function from the decoded header to the header to write instead
+    :return: None
+    """
+    with open(path, "rb") as snap_f:
+        data = snap_f.read()
+    header_start = len(snapshot.MAGIC) + 8
+    header_len = struct.unpack_from("<II", data, len(snapshot.MAGIC))[1]
+    header = json.dumps(change(json.loads(data[header_start:header_start + header_len])), separators=(",", ":"))
+    header = header.encode("utf-8")
+    assert len(header) <= header_len
+    with open(path, "wb") as snap_f:
+        snap_f.write(data[:header_start] + header.ljust(header_len) + data[header_start + header_len:])
+
+
+def without(key: str):
+    """
+    Makes a change to a header that leaves out one of its keys.
+    """
+    return lambda header: {name: value for name, value in header.items() if name != key}
+
+
+def replaced(key: str, value):
+    """
+    Makes a change to a header that gives one of its keys another value.
+    """
+    return lambda header: {**header, key: value}
+
+
+def column_changed(name: str, key: str, value):
+    """
+    Makes a change to a header that gives one key of a column another value.
+    """
+    return lambda header: {**header, "columns": {**header["columns"], name: {**header["columns"][name], key: value}}}
+
+
+@pytest.mark.parametrize("change", [
+    without("columns"), without("sources"), without("tables"),
+    replaced("columns", []), replaced("sources", {}), replaced("tables", 1),
+    replaced("sources", [{"size": "1"}]), replaced("tables", {"genres": [1]}),
+    column_changed("genres", "offset", None), column_changed("genres", "length", 1.5),
+    column_changed("genres", "typecode", "Z"),
+    lambda header: {**header, "columns": {name: info for name, info in header["columns"].items()
+                                          if name != "movie_line_hashes"}},
+    lambda header: [header],
+], ids=["no columns", "no sources", "no tables", "columns list", "sources dict", "tables int", "source size",
+        "table code", "column offset", "column length", "column typecode", "missing column", "not an object"])
+def test_malformed_header_is_rejected(saved, change):
+    path, files = saved
+    rewrite_header(path, change)
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(path)
+    assert snapshot.load_snapshot(path, files) is None
+
+
+def test_cut_off_snapshot_is_rejected(saved):
+    path, files = saved
+    with open(path, "rb") as snap_f:
+        data = snap_f.read()
+    with open(path, "wb") as snap_f:
+        snap_f.write(data[:-8])
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(path)
+
+
+def test_snapshot_is_loaded(saved):
+    path, files = saved
+    movies, ratings, titles, current, hashes = snapshot.load_snapshot(path, files)
+    assert current and hashes is None and titles is None
+    assert movies["tt0000001"].primary_title == "The Shining" and ratings["tt0000001"].num_votes == 1000000